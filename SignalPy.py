@@ -1,9 +1,37 @@
-from datetime import datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+from datetime import datetime, timedelta, timezone, time as day_time
 import requests
+from itertools import islice
 from enum import Enum
+import threading
+import bisect
+import os
+import math
+import csv
+import weakref
+import gzip
+import asyncio
 import json
+import time
 import re
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
 
 # todo Appearance: https://documentation.onesignal.com/reference#section-appearance
 # todo Grouping and Collapsing: https://documentation.onesignal.com/reference#section-grouping-collapsing
@@ -14,14 +42,18 @@ class _LangCodes:
 
     def load(self, filename):
         """ loads lang codes from json file """
-        data = json.loads(open(filename, 'r').read())
+        with open(filename, 'r') as f:
+            data = json.load(f)
         for key, info in data.items():
             setattr(self, info['name'], key)
         return self
 
 
 # load language codes from json file
-LangCodes = _LangCodes().load('lang_codes.json')
+LangCodes = _LangCodes().load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lang_codes.json'))
+
+# maximum number of player ids accepted per api call
+_PLAYER_ID_LIMIT = 2000
 
 
 class Relation(Enum):
@@ -45,11 +77,14 @@ class Delivery:
     def send_after(self, date: datetime):
         """
         Schedule notification for future delivery.
-        :param date: future date
+        :param date: future date, naive dates are taken as local time
         """
-        if date < datetime.now():
+        if date.tzinfo is None:
+            date = date.astimezone()
+        if date < datetime.now(timezone.utc):
             raise Exception('date cannot be in the past')
 
+        date = date.astimezone(timezone.utc)
         self._data['send_after'] = date.strftime('%Y-%m-%d %H:%M:%S GMT-0000')
         return self
 
@@ -227,16 +262,16 @@ class Filter:
         """
         Filter.accepts([Relation.GreaterThan, Relation.LowerThan,
                         Relation.Equal], relation)
-        self._base_filter(key, relation, amount)
+        return self._base_filter('bought_sku', relation, amount, key=key)
 
-    def tag(self, key: str, relation: Relation, value: str):
+    def tag(self, key: str, relation: Relation, value: str = None):
         """
         Note: value is not required for "exists or "not_exists"
         :param key: tag key to compare to
         :param relation: ">", "<", "=", "!=", "exists", "not_exists"
         :param value: Tag value to compare to
         """
-        self._base_filter('tag', relation, value, key=key)
+        return self._base_filter('tag', relation, value, key=key)
 
     def language(self, relation: Relation, lang: str):
         """
@@ -244,7 +279,7 @@ class Filter:
         :param lang: 2 character lang code
         """
         Filter.accepts([Relation.Equal, Relation.NotEqual], relation)
-        self._base_filter('language', relation, lang)
+        return self._base_filter('language', relation, lang)
 
     def app_version(self, relation: Relation, version: str):
         """
@@ -253,7 +288,7 @@ class Filter:
         """
         Filter.accepts([Relation.GreaterThan, Relation.LowerThan,
                         Relation.Equal, Relation.NotEqual], relation)
-        self._base_filter('app_version', relation, version)
+        return self._base_filter('app_version', relation, version)
 
     def location(self, radius: float, lat: float, long: float):
         """
@@ -261,7 +296,7 @@ class Filter:
         :param lat: latitude
         :param long: longitude
         """
-        self._data.append({'radius': radius, 'lat': lat, 'long': long})
+        self._data.append({'field': 'location', 'radius': radius, 'lat': lat, 'long': long})
         return self
 
     def country(self, country_code: str):
@@ -390,6 +425,135 @@ class TargetDevice:
         return json.dumps(self._data)
 
 
+_encode_text = json.encoder.encode_basestring_ascii
+
+
+def _encode_value(value):
+    """ :return: json encoded value, strings skip the generic encoder """
+    return _encode_text(value) if isinstance(value, str) else json.dumps(value)
+
+
+def _immutable(*args, **kwargs):
+    raise TypeError('LocalizedText is immutable, use merge')
+
+
+def _text_hash(lang: str, text: str):
+    """ :return: hash of one translation, summed into the interning key """
+    return hash((lang, text))
+
+
+class LocalizedText(dict):
+    """
+    Immutable map of language codes (see LangCodes) to text. Equal texts are
+    interned, so campaigns reusing the same translations across many
+    notifications share a single instance whose json is encoded only once.
+    Being a dict, it serializes with json.dumps like any other payload field.
+    """
+
+    __slots__ = ('_key', '_fragments', '_json', '__weakref__')
+
+    _interned = weakref.WeakValueDictionary()
+    _lock = threading.Lock()
+
+    def __new__(cls, texts=None):
+        """
+        :param texts: map of language codes to text
+        Example: {"en": "English Message", "es": "Spanish Message"}
+        """
+        if isinstance(texts, LocalizedText):
+            return texts
+        texts = dict(texts or {})
+        fragments = {lang: _encode_value(lang) + ': ' + _encode_value(text)
+                     for lang, text in texts.items()}
+        key = sum(_text_hash(lang, text) for lang, text in texts.items())
+        return cls._intern(texts, fragments, key)
+
+    def __init__(self, texts=None):
+        """ every field is set by _intern """
+
+    @classmethod
+    def _intern(cls, texts: dict, fragments: dict, key: int):
+        """
+        :param texts: map of language codes to text
+        :param fragments: encoded '"lang": "text"' json fragment of every language
+        :param key: sum of the translation hashes
+        :return: the interned instance equal to texts, built completely
+        before it is published so it can be shared across threads
+        """
+        instance = dict.__new__(cls)
+        dict.update(instance, texts)
+        instance._key = key
+        instance._fragments = fragments
+        instance._json = '{' + ', '.join(map(fragments.__getitem__, texts)) + '}'
+
+        with cls._lock:
+            existing = cls._interned.get(key)
+            if existing is not None and dict.__eq__(existing, texts):
+                return existing
+            if existing is None:
+                cls._interned[key] = instance
+        return instance
+
+    def merge(self, texts):
+        """
+        :param texts: map of language codes to new or replaced text
+        :return: LocalizedText holding both, only changed languages are
+        re-encoded and re-hashed
+        """
+        if not self and isinstance(texts, LocalizedText):
+            return texts
+
+        changed = {lang: text for lang, text in texts.items() if lang not in self or self[lang] != text}
+        if not changed:
+            return self
+
+        key = self._key
+        fragments = dict(self._fragments)
+        for lang, text in changed.items():
+            if lang in self:
+                key -= _text_hash(lang, self[lang])
+            key += _text_hash(lang, text)
+            fragments[lang] = _encode_value(lang) + ': ' + _encode_value(text)
+
+        merged = dict(self)
+        merged.update(changed)
+        return LocalizedText._intern(merged, fragments, key)
+
+    @property
+    def json(self):
+        """ :return: json string representation, encoded once per instance """
+        return self._json
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def copy(self):
+        """ :return: plain dict copy """
+        return dict(self)
+
+    def __reduce__(self):
+        return LocalizedText, (dict(self),)
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return 'LocalizedText({})'.format(dict.__repr__(self))
+
+
+def _to_json(payload: dict):
+    """
+    json encode a notification payload, splicing in
+    the cached json of its LocalizedText fields
+    :param payload: notification payload
+    :return: json string
+    """
+    parts = []
+    for key, value in payload.items():
+        encoded = value.json if isinstance(value, LocalizedText) else json.dumps(value)
+        parts.append(json.dumps(key) + ': ' + encoded)
+    return '{' + ', '.join(parts) + '}'
+
+
 class Notification:
     def __init__(self):
         self._data = {}
@@ -436,6 +600,19 @@ class Notification:
         """
         self._data['included_segments'] = segments
 
+    def _localize(self, field: str, texts):
+        """
+        merge texts into a localized field
+        :param field: payload field
+        :param texts: map of language codes to text or a LocalizedText
+        """
+        localized = self._data.get(field)
+        if localized is None:
+            self._data[field] = LocalizedText(texts)
+        else:
+            self._data[field] = LocalizedText(localized).merge(texts)
+        return self
+
     def add_content(self, lang_code: str, message: str):
         """
         The notification's content (excluding the title),
@@ -443,32 +620,23 @@ class Notification:
         :param lang_code: language code string
         :param message: localized text
         """
-        if not hasattr(self._data, 'contents'):
-            self._data['contents'] = {}
-
-        self._data['contents'][lang_code] = message
-        return self
+        return self._localize('contents', {lang_code: message})
 
     def add_contents(self, json_content: dict):
         """
         The notification's content (excluding the title),
         a map of language codes to text for each language.
-        :param json_content: add bulk json content
+        :param json_content: add bulk json content, a dict or a shared LocalizedText
         Example: {"en": "English Message", "es": "Spanish Message"}
         """
-        if not hasattr(self._data, 'contents'):
-            self._data['contents'] = {}
-
-        data = self._data['contents'].items() + json_content.items()
-        self._data['contents'] = dict(data)
-        return self
+        return self._localize('contents', json_content)
 
     @property
     def contents(self):
         """ :return: The notification's content (excluding the title),
         a map of language codes to text for each language. """
 
-        return self._data.get('content')
+        return self._data.get('contents')
 
     @contents.setter
     def contents(self, json_content):
@@ -485,24 +653,15 @@ class Notification:
         :param lang_code: language code string
         :param heading: localized text
         """
-        if not hasattr(self._data, 'headings'):
-            self._data['headings'] = {}
-
-        self._data['headings'][lang_code] = heading
-        return self
+        return self._localize('headings', {lang_code: heading})
 
     def add_headings(self, json_heading: dict):
         """
         The notification's title, a map of language codes to text for each language
-        :param json_heading: add bulk json heading
+        :param json_heading: add bulk json heading, a dict or a shared LocalizedText
         Example: {"en": "English Title", "es": "Spanish Title"}
         """
-        if not hasattr(self._data, 'headings'):
-            self._data['headings'] = {}
-
-        data = self._data['headings'].items() + json_heading.items()
-        self._data['headings'] = dict(data)
-        return self
+        return self._localize('headings', json_heading)
 
     @property
     def headings(self):
@@ -525,30 +684,21 @@ class Notification:
         :param lang_code: language code string
         :param subtitle: localized text
         """
-        if not hasattr(self._data, 'subtitle'):
-            self._data['subtitle'] = {}
-
-        self._data['subtitle'][lang_code] = subtitle
-        return self
+        return self._localize('subtitle', {lang_code: subtitle})
 
     def add_subtitles(self, json_subtitles: dict):
         """
         The notification's subtitle, a map of language codes to text for each language.
-        :param json_subtitles: add bulk json heading
+        :param json_subtitles: add bulk json heading, a dict or a shared LocalizedText
         Example: {"en": "English Subtitle", "es": "Spanish Subtitle"}
         """
-        if not hasattr(self._data, 'subtitle'):
-            self._data['subtitle'] = {}
-
-        data = self._data['subtitle'].items() + json_subtitles.items()
-        self._data['subtitle'] = dict(data)
-        return self
+        return self._localize('subtitle', json_subtitles)
 
     @property
     def subtitles(self):
         """ :return: The notification's subtitle, a map of
         language codes to text for each language. """
-        return self._data.get('subtitles')
+        return self._data.get('subtitle')
 
     @subtitles.setter
     def subtitles(self, json_subtitles: dict):
@@ -800,30 +950,1304 @@ class Notification:
         :param target: TargetDevice instance
         """
 
-        self.data = {**self._data, **target.data}
+        self._data = {**self._data, **target.data}
         return self
 
+    def copy(self):
+        """ :return: shallow copy of this notification, LocalizedText fields are shared """
+        notification = Notification()
+        notification._data = dict(self._data)
+        return notification
+
     @property
     def data(self):
         return self._data
 
     def to_json(self):
         """ :return: json string representation of this notification"""
-        return json.dumps(self._data)
+        return _to_json(self._data)
+
+
+def _column(data, name: str):
+    """
+    fetch a column from a pandas DataFrame, Arrow table,
+    numpy structured array or dict of sequences
+    :param data: columnar data
+    :param name: column name
+    :return: list of native python values
+    """
+    column = data[name]
+    if hasattr(column, 'to_numpy'):
+        # pandas Series and pyarrow ChunkedArray
+        column = column.to_numpy()
+    return column.tolist() if hasattr(column, 'tolist') else list(column)
+
+
+def _is_missing(value):
+    """ :return: True for None and NaN cells """
+    return value is None or value != value
+
+
+def _codes(values: list):
+    """
+    factorize a column, missing cells become None
+    :param values: python values of a column
+    :return: (codes, distinct values) tuple, codes is a range when every value is distinct
+    """
+    table = dict.fromkeys(values)
+    if None not in table and (float not in set(map(type, table)) or
+                              all(value == value for value in table)):
+        if len(table) == len(values):
+            return range(len(values)), values
+        index = {value: code for code, value in enumerate(table)}
+        return list(map(index.__getitem__, values)), list(table)
+
+    table = {}
+    codes = [table.setdefault(None if _is_missing(value) else value, len(table)) for value in values]
+    return codes, list(table)
+
+
+def _encode_values(values: list):
+    """ :return: json of every value, None for missing ones """
+    try:
+        return list(map(_encode_text, values))
+    except TypeError:
+        return [None if _is_missing(value) else _encode_value(value) for value in values]
+
+
+class BulkNotification:
+    """ Build notification payloads in bulk from columnar data """
+
+    _localized_fields = ('contents', 'headings', 'subtitle')
+    _scalar_fields = ('url', 'big_picture', 'adm_big_picture',
+                      'chrome_big_picture', 'ios_category')
+
+    def __init__(self, data, fields: dict, player_ids: str,
+                 language: str = None, base: Notification = None,
+                 default_language: str = LangCodes.English):
+        """
+        Initiate a new bulk builder
+        :param data: DataFrame, Arrow table, numpy structured array or dict of columns
+        :param fields: map of notification fields to column names
+        Example: {"contents": "body", "headings": "title", "url": "link"}
+        :param player_ids: name of the player id column
+        :param language: optional name of the language code column
+        :param base: optional notification holding the fields shared by every row,
+        and the values used for missing cells
+        :param default_language: language used for localized fields when
+        no language column is provided or its cell is missing
+        """
+        for field in fields:
+            if field not in self._localized_fields + self._scalar_fields:
+                raise Exception('Unsupported bulk field: {}'.format(field))
+
+        self._fields = fields
+        self._player_ids = _column(data, player_ids)
+        self._language = _column(data, language) if language else None
+        self._columns = {field: _column(data, name) for field, name in fields.items()}
+        self._base = base if base is not None else Notification()
+        self._default_language = default_language
+        self._templates = {}
+
+    def _template(self, lang: str, present: tuple):
+        """
+        :param lang: language code of the localized fields
+        :param present: whether each mapped field has a value, missing ones keep the base value
+        :return: body template with a %s per present field and one for the player ids,
+        the base notification is encoded once per template rather than once per row
+        """
+        template = self._templates.get((lang, present))
+        if template is None:
+            data = self._base.data
+            base = {key: value for key, value in data.items()
+                    if key not in self._fields and not key.startswith('include_')}
+            parts = [_to_json(base)[1:-1].replace('%', '%%')] if base else []
+            for field, has_value in zip(self._fields, present):
+                name = _encode_value(field).replace('%', '%%')
+                if not has_value:
+                    if data.get(field) is not None:
+                        parts.append(_to_json({field: data[field]})[1:-1].replace('%', '%%'))
+                elif field in self._localized_fields:
+                    texts = dict(data.get(field) or {})
+                    texts[lang] = None
+                    fragments = [_encode_value(key).replace('%', '%%') + ': ' +
+                                 ('%s' if key == lang else _encode_value(text).replace('%', '%%'))
+                                 for key, text in texts.items()]
+                    parts.append(name + ': {' + ', '.join(fragments) + '}')
+                else:
+                    parts.append(name + ': %s')
+            parts.append('"include_player_ids": [%s]')
+            template = '{' + ', '.join(parts) + '}'
+            self._templates[(lang, present)] = template
+        return template
+
+    def payloads(self, chunk_size: int = _PLAYER_ID_LIMIT):
+        """
+        group rows holding identical payloads and serialize them in batches:
+        every distinct cell value is encoded once and every body is rendered
+        from a per language template
+        :param chunk_size: maximum number of player ids per payload
+        :return: generator of (json body bytes, player ids) tuples
+        """
+        if chunk_size > _PLAYER_ID_LIMIT:
+            raise Exception('Exceeded the limit of 2000 per api call')
+
+        player_ids = self._player_ids
+        length = len(player_ids)
+
+        keys, encoded = [], []
+        for column in self._columns.values():
+            codes, distinct = _codes(column)
+            keys.append(codes)
+            encoded.append(_encode_values(distinct))
+
+        languages = [self._default_language]
+        if self._language is not None:
+            codes, languages = _codes(self._language)
+            languages = [self._default_language if lang is None else lang for lang in languages]
+            keys.append(codes)
+
+        if any(isinstance(codes, range) for codes in keys):
+            # a column holding a distinct value per row makes every row its own group
+            members, group_keys = None, keys
+        elif keys:
+            groups = {}
+            group_of = [groups.setdefault(key, len(groups)) for key in zip(*keys)]
+            members = [[] for _ in range(len(groups))]
+            for row, group in enumerate(group_of):
+                members[group].append(row)
+            group_keys = list(zip(*groups))
+        else:
+            members, group_keys = [list(range(length))], []
+
+        count = length if members is None else len(members)
+        lang_codes = group_keys[-1] if self._language is not None else [0] * count
+        columns = [values if isinstance(codes, range) else list(map(values.__getitem__, codes))
+                   for values, codes in zip(encoded, group_keys)]
+
+        if any(None in values for values in encoded):
+            rows = [tuple(value for value in row if value is not None) for row in zip(*columns)]
+            masks = (tuple(value is not None for value in row) for row in zip(*columns))
+            templates = [self._template(languages[lang], mask) for lang, mask in zip(lang_codes, masks)]
+        else:
+            rows = zip(*columns) if columns else [()] * count
+            by_language = [self._template(lang, (True,) * len(columns)) for lang in languages]
+            templates = map(by_language.__getitem__, lang_codes)
+
+        if members is None:
+            encoded_ids = _encode_values(player_ids)
+            if None in encoded_ids:
+                raise Exception('Missing player id in row {}'.format(encoded_ids.index(None)))
+            bodies = map(str.__mod__, templates, map(tuple.__add__, rows, zip(encoded_ids)))
+            yield from zip(map(str.encode, bodies), ([player_id] for player_id in player_ids))
+            return
+
+        for template, row, group in zip(templates, rows, members):
+            for start in range(0, len(group), chunk_size):
+                chunk = [player_ids[index] for index in group[start:start + chunk_size]]
+                body = template % (row + (', '.join(map(_encode_value, chunk)),))
+                yield body.encode(), chunk
+
+
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = 0x100000001b3
+_FNV_MASK = 0xffffffffffffffff
+
+
+def _fnv1a(data: bytes, seed: int = _FNV_OFFSET):
+    """ :return: 64-bit FNV-1a hash of data, continuing from seed """
+    value = seed
+    for byte in data:
+        value = ((value ^ byte) * _FNV_PRIME) & _FNV_MASK
+    return value
+
+
+def _fmix64(value: int):
+    """ :return: murmur3 64-bit finalizer of value, spreading every input bit over the high bits """
+    value ^= value >> 33
+    value = (value * 0xff51afd7ed558ccd) & _FNV_MASK
+    value ^= value >> 33
+    value = (value * 0xc4ceb9fe1a85ec53) & _FNV_MASK
+    return value ^ (value >> 33)
+
+
+def _fmix64_array(values):
+    """ :return: vectorised _fmix64 over a numpy uint64 array """
+    shift = np.uint64(33)
+    values = values ^ (values >> shift)
+    values = values * np.uint64(0xff51afd7ed558ccd)
+    values = values ^ (values >> shift)
+    values = values * np.uint64(0xc4ceb9fe1a85ec53)
+    return values ^ (values >> shift)
+
+
+def _fnv1a_array(values: list, seed: int):
+    """
+    vectorised _fnv1a over many strings, processing one byte column at a time
+    :param values: strings to hash
+    :param seed: hash state to start from
+    :return: numpy uint64 array of hashes
+    """
+    encoded = np.char.encode(np.asarray(values, dtype=str), 'utf-8')
+    lengths = np.char.str_len(encoded)
+    width = encoded.dtype.itemsize
+    columns = encoded.view(np.uint8).reshape(len(encoded), width)
+
+    hashes = np.full(len(encoded), seed, dtype=np.uint64)
+    prime = np.uint64(_FNV_PRIME)
+    for column in range(width):
+        mixed = (hashes ^ columns[:, column]) * prime
+        hashes = np.where(lengths > column, mixed, hashes)
+    return hashes
+
+
+class Experiment:
+    """
+    Split an audience between notification variants by stable hashing, so a player
+    always lands in the same variant for a given experiment name, in any process.
+    """
+
+    def __init__(self, name: str, base: Notification):
+        """
+        :param name: experiment name, salts the hash so experiments split independently
+        :param base: notification holding the fields shared by every variant
+        """
+        self._name = name
+        self._base = base
+        self._seed = _fnv1a(name.encode('utf-8') + b':')
+        self._variants = []
+        self._weights = []
+        self._bounds = []
+
+    def add_variant(self, name: str, weight: float, contents: dict = None,
+                    headings: dict = None, data: dict = None):
+        """
+        add a variant overriding parts of the base notification
+        :param name: variant name
+        :param weight: relative share of the audience
+        :param contents: optional content overrides, a map of language codes to text
+        :param headings: optional heading overrides, a map of language codes to text
+        :param data: optional custom data merged into the base data
+        """
+        if weight <= 0:
+            raise Exception('variant weight must be positive')
+
+        notification = self._base.copy()
+        if contents:
+            notification.add_contents(contents)
+        if headings:
+            notification.add_headings(headings)
+        if data:
+            notification.add_data({**(self._base.data.get('data') or {}), **data})
+
+        self._variants.append((name, notification))
+        self._weights.append(weight)
+        total, running = sum(self._weights), 0.0
+        self._bounds = []
+        for weight in self._weights:
+            running += weight
+            self._bounds.append(running / total)
+        self._bounds[-1] = 1.0
+        return self
+
+    @property
+    def variants(self):
+        """ :return: list of variant names """
+        return [name for name, _ in self._variants]
+
+    def assign(self, player_id: str):
+        """
+        :param player_id: player id
+        :return: name of the variant the player belongs to
+        """
+        if not self._variants:
+            raise Exception('Experiment has no variants')
+        return self._variants[self._index(player_id)][0]
+
+    def _index(self, player_id: str):
+        """ :return: variant index of a player id """
+        # plain FNV-1a leaves the high bits poorly mixed for ids sharing a prefix
+        fraction = (_fmix64(_fnv1a(player_id.encode('utf-8'), self._seed)) >> 11) / 2.0 ** 53
+        return bisect.bisect_right(self._bounds, fraction)
+
+    def _assign_block(self, player_ids: list):
+        """ :return: variant index of every player id in the block """
+        if np is None:
+            return [self._index(player_id) for player_id in player_ids]
+        hashes = _fmix64_array(_fnv1a_array(player_ids, self._seed))
+        fractions = (hashes >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+        return np.searchsorted(np.asarray(self._bounds), fractions, side='right')
+
+    def _blocks(self, player_ids, block_size: int):
+        """ :return: generator of (player id block, variant indexes) """
+        if not self._variants:
+            raise Exception('Experiment has no variants')
+        player_ids = iter(player_ids)
+        while True:
+            block = list(islice(player_ids, block_size))
+            if not block:
+                return
+            yield block, self._assign_block(block)
+
+    def assignments(self, player_ids, block_size: int = 65536):
+        """
+        stream the variant of every player, for example to log them for analysis
+        :param player_ids: iterable of player ids, read block by block
+        :param block_size: number of ids hashed per vectorised pass
+        :return: generator of (player id, variant name) tuples
+        """
+        names = self.variants
+        for block, indexes in self._blocks(player_ids, block_size):
+            for player_id, index in zip(block, indexes):
+                yield player_id, names[index]
+
+    def fan_out(self, player_ids, chunk_size: int = _PLAYER_ID_LIMIT, block_size: int = 65536):
+        """
+        split an audience between the variants and target every bucket in chunks
+        :param player_ids: iterable of player ids, read block by block
+        :param chunk_size: maximum number of player ids per notification
+        :param block_size: number of ids hashed per vectorised pass
+        :return: generator of (variant name, Notification) tuples
+        """
+        buckets = [[] for _ in self._variants]
+        for block, indexes in self._blocks(player_ids, block_size):
+            if np is not None:
+                block = np.asarray(block, dtype=object)
+                for index, bucket in enumerate(buckets):
+                    bucket.extend(block[indexes == index].tolist())
+            else:
+                for player_id, index in zip(block, indexes):
+                    buckets[index].append(player_id)
+
+            for index, bucket in enumerate(buckets):
+                while len(bucket) >= chunk_size:
+                    yield self._chunk(index, bucket[:chunk_size])
+                    del bucket[:chunk_size]
+
+        for index, bucket in enumerate(buckets):
+            if bucket:
+                yield self._chunk(index, bucket)
+
+    def _chunk(self, index: int, player_ids: list):
+        name, notification = self._variants[index]
+        target = TargetDevice().include_player_ids(player_ids)
+        return name, notification.copy().set_target_device(target)
+
+
+def _timezone(tz):
+    """
+    :param tz: offset in seconds (as in OneSignal player records, numeric strings
+    included), timedelta, tzinfo, '+05:30' style string or IANA timezone name
+    :return: tzinfo instance
+    """
+    if isinstance(tz, (int, float)):
+        return timezone(timedelta(seconds=int(tz)))
+    if isinstance(tz, timedelta):
+        return timezone(tz)
+    if isinstance(tz, str):
+        tz = tz.strip()
+        if re.match(r'^[+-]?\d+(\.\d+)?$', tz):
+            return timezone(timedelta(seconds=int(float(tz))))
+        match = re.match(r'^(?:UTC|GMT)?([+-])(\d{1,2}):?(\d{2})?$', tz)
+        if match:
+            sign, hours, minutes = match.groups()
+            seconds = int(hours) * 3600 + int(minutes or 0) * 60
+            return timezone(timedelta(seconds=-seconds if sign == '-' else seconds))
+        if ZoneInfo is None:
+            raise Exception('Timezone names require Python 3.9 or newer: {}'.format(tz))
+        return ZoneInfo(tz)
+    return tz
+
+
+class LocalDeliveryPlanner:
+    """
+    Deliver a notification at the same local time of day everywhere by grouping
+    recipients by delivery instant and scheduling every group with its own send_after,
+    instead of leaving the timezone handling to DelayedOption.Timezone.
+    """
+
+    def __init__(self, base: Notification, time_of_day: day_time, start: datetime = None,
+                 lead: timedelta = timedelta(hours=2), margin: timedelta = timedelta(minutes=10),
+                 chunk_size: int = _PLAYER_ID_LIMIT):
+        """
+        :param base: notification sent to every recipient
+        :param time_of_day: local delivery time
+        :param start: deliver at the first time_of_day after this moment, defaults to now
+        :param lead: how long before a delivery its submissions may start
+        :param margin: how long before a delivery its submissions must be done
+        :param chunk_size: maximum number of player ids per notification
+        """
+        if start is not None and start.tzinfo is None:
+            start = start.astimezone()
+        self._start = (start or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        self._time_of_day = time_of_day
+        self._lead = lead
+        self._margin = margin
+        self._chunk_size = chunk_size
+        self._deliveries = {}
+
+        # timezone handling is done here, the server must not shift delivery again
+        self._base = base.copy()
+        self._base.data.pop('delayed_option', None)
+        self._base.data.pop('delivery_time_of_day', None)
+
+    def delivery_time(self, tz):
+        """
+        :param tz: utc offset in seconds or any timezone accepted by plan
+        :return: utc datetime of the next local time_of_day in that timezone, using
+        the offset in effect at the delivery itself rather than at start
+        """
+        zone = _timezone(tz)
+        local = self._start.astimezone(zone)
+        delivery = datetime.combine(local.date(), self._time_of_day, tzinfo=zone)
+        if delivery <= local:
+            delivery = datetime.combine(local.date() + timedelta(days=1), self._time_of_day, tzinfo=zone)
+        return delivery.astimezone(timezone.utc)
+
+    def _delivery(self, tz):
+        """ :return: delivery_time, cached per timezone """
+        send_after = self._deliveries.get(tz)
+        if send_after is None:
+            send_after = self._deliveries[tz] = self.delivery_time(tz)
+        return send_after
+
+    def _chunk(self, send_after: datetime, player_ids: list):
+        notification = self._base.copy()
+        notification.set_delivery(Delivery().send_after(send_after))
+        notification.set_target_device(TargetDevice().include_player_ids(player_ids))
+        return send_after, notification
+
+    def plan(self, audience):
+        """
+        group recipients by delivery instant in a single streaming pass
+        :param audience: iterable of (player id, timezone) tuples
+        :return: generator of (send_after, Notification) tuples, full chunks
+        are yielded as soon as they fill up
+        """
+        buckets = {}
+        for player_id, tz in audience:
+            send_after = self._delivery(tz)
+            bucket = buckets.get(send_after)
+            if bucket is None:
+                bucket = buckets[send_after] = []
+            bucket.append(player_id)
+            if len(bucket) == self._chunk_size:
+                yield self._chunk(send_after, bucket)
+                buckets[send_after] = []
+
+        for send_after, bucket in buckets.items():
+            if bucket:
+                yield self._chunk(send_after, bucket)
+
+    def schedule(self, audience, now: datetime = None):
+        """
+        spread the submissions of every delivery group evenly between
+        lead and margin before its delivery
+        :param audience: iterable of (player id, timezone) tuples
+        :param now: current time, defaults to now
+        :return: list of (submit_at, send_after, Notification) tuples sorted by submit_at
+        """
+        now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        groups = {}
+        for send_after, notification in self.plan(audience):
+            groups.setdefault(send_after, []).append(notification)
+
+        schedule = []
+        for send_after, notifications in groups.items():
+            first = max(now, send_after - self._lead)
+            window = max(send_after - self._margin - first, timedelta(0))
+            step = window / len(notifications)
+            for position, notification in enumerate(notifications):
+                schedule.append((first + step * position, send_after, notification))
+        schedule.sort(key=lambda item: item[0])
+        return schedule
+
+    def run(self, client: 'OneSignal', audience, workers=8):
+        """
+        submit the schedule, waiting until every notification is due
+        :param client: OneSignal instance
+        :param audience: iterable of (player id, timezone) tuples
+        :param workers: number of concurrent requests, or an AdaptiveLimit
+        :return: generator of (index, response, error) tuples, see OneSignal.post_many
+        """
+        def due():
+            for submit_at, _, notification in self.schedule(audience):
+                delay = (submit_at - datetime.now(timezone.utc)).total_seconds()
+                if delay > 0:
+                    time.sleep(delay)
+                yield notification
+
+        return client.post_many(due(), workers=workers)
+
+
+_EARTH_RADIUS = 6371008.8
+
+_COMPARISONS = {'>': np.greater, '<': np.less,
+                '=': np.equal, '!=': np.not_equal} if np is not None else {}
+
+
+def _factorize(values):
+    """
+    :param values: string column, None or '' for missing values
+    :return: (codes, categories) where missing values map to the '' category
+    """
+    values = np.asarray(['' if value is None else str(value) for value in values], dtype=str)
+    categories, codes = np.unique(values, return_inverse=True)
+    return codes.reshape(-1).astype(np.int32), categories
+
+
+def _timestamp(value):
+    """ :return: unix time from a number or 'YYYY-MM-DD HH:MM:SS' string, NaN when missing """
+    if value is None or value == '':
+        return math.nan
+    try:
+        return float(value)
+    except ValueError:
+        date = datetime.fromisoformat(value.replace(' UTC', '').strip())
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return date.timestamp()
+
+
+def _number(value):
+    """ :return: float value, NaN when missing or not numeric """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _version(text: str):
+    """ :return: comparable tuple of the numbers in a version string """
+    return tuple(int(part) for part in re.findall(r'\d+', text))
+
+
+class PlayerIndex:
+    """
+    Columnar snapshot of player records evaluating Filter expressions locally
+    with numpy, to preview audience sizes and target players without round-trips.
+    Requires numpy.
+    """
+
+    _numeric = ('session_count', 'playtime', 'amount_spent', 'last_active', 'created_at', 'lat', 'long')
+    _categorical = ('language', 'country', 'game_version')
+    _fields = {'session_count': 'session_count', 'session_time': 'playtime',
+               'amount_spent': 'amount_spent'}
+
+    def __init__(self, columns: dict):
+        """
+        :param columns: map of column names to equally long sequences: 'id' plus any of
+        session_count, playtime, amount_spent, last_active and created_at (unix time),
+        lat, long, language, country, game_version and tags (dicts or json strings)
+        """
+        if np is None:
+            raise Exception('PlayerIndex requires numpy')
+
+        self._ids = np.asarray(columns['id'], dtype=object)
+        self._numbers = {name: np.asarray(columns[name], dtype=np.float64)
+                         for name in self._numeric if name in columns}
+        self._strings = {}
+        for name in self._categorical:
+            if name in columns:
+                column = columns[name]
+                self._strings[name] = column if isinstance(column, tuple) else _factorize(column)
+        self._tags = columns.get('tags')
+        self._tag_columns = {}
+
+    @classmethod
+    def from_export(cls, path: str):
+        """
+        load a OneSignal csv player export (.csv or .csv.gz)
+        :param path: export file
+        """
+        opener = gzip.open if path.endswith('.gz') else open
+        columns = {name: [] for name in ('id', 'tags') + cls._numeric + cls._categorical}
+        timestamps = ('last_active', 'created_at')
+        with opener(path, 'rt', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                for name, column in columns.items():
+                    value = row.get(name)
+                    if name in timestamps:
+                        value = _timestamp(value)
+                    elif name in cls._numeric:
+                        value = _number(value)
+                    column.append(value)
+        return cls(columns)
+
+    def save(self, path: str):
+        """
+        cache the index as a numpy archive
+        :param path: archive file
+        """
+        arrays = {'id': np.asarray(self._ids, dtype=str)}
+        arrays.update(self._numbers)
+        for name, (codes, categories) in self._strings.items():
+            arrays[name + '.codes'], arrays[name + '.categories'] = codes, categories
+        if self._tags is not None:
+            # missing tags are stored as '', numpy would turn None into 'None'
+            arrays['tags'] = np.asarray([tags if isinstance(tags, str) else json.dumps(tags) if tags else ''
+                                         for tags in self._tags], dtype=str)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        load an index cached with save
+        :param path: archive file
+        """
+        with np.load(path) as archive:
+            columns = {name: archive[name] for name in archive.files if '.' not in name}
+            for name in cls._categorical:
+                if name + '.codes' in archive.files:
+                    columns[name] = (archive[name + '.codes'], archive[name + '.categories'])
+        return cls(columns)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _number_column(self, name: str):
+        if name not in self._numbers:
+            raise Exception('Player index has no {} column'.format(name))
+        return self._numbers[name]
+
+    def _string_column(self, name: str):
+        if name not in self._strings:
+            raise Exception('Player index has no {} column'.format(name))
+        return self._strings[name]
+
+    def _tag_column(self, key: str):
+        """ :return: (codes, categories) of a tag, built on first use """
+        if self._tags is None:
+            raise Exception('Player index has no tags column')
+        if key not in self._tag_columns:
+            values = []
+            for tags in self._tags:
+                if isinstance(tags, str):
+                    tags = json.loads(tags) if tags else None
+                values.append(tags.get(key) if tags else None)
+            self._tag_columns[key] = _factorize(values)
+        return self._tag_columns[key]
+
+    @staticmethod
+    def _match_strings(column, relation: str, value, numeric: bool = False, version: bool = False):
+        """
+        evaluate a relation once per distinct value and map the result back to every player
+        """
+        codes, categories = column
+        present = categories != ''
+        if relation == Relation.Exists.value:
+            return present[codes]
+        if relation == Relation.NotExists.value:
+            return ~present[codes]
+
+        if relation in ('>', '<') and (numeric or version):
+            if version:
+                target = _version(str(value))
+                keys = [_version(category) for category in categories]
+                selected = [key > target if relation == '>' else key < target for key in keys]
+                selected = np.asarray(selected, dtype=bool)
+            else:
+                numbers = np.asarray([_number(category) for category in categories])
+                selected = _COMPARISONS[relation](numbers, float(value))
+        else:
+            selected = _COMPARISONS[relation](categories, str(value))
+        return (selected & present)[codes]
+
+    def _condition(self, entry: dict, now: float):
+        """ :return: boolean mask of the players matching one filter entry """
+        field = entry.get('field')
+        relation = entry.get('relation')
+        value = entry.get('value')
+
+        if field == 'location' or (field is None and 'radius' in entry):
+            lat = np.radians(self._number_column('lat'))
+            long = np.radians(self._number_column('long'))
+            center_lat, center_long = math.radians(float(entry['lat'])), math.radians(float(entry['long']))
+            a = (np.sin((lat - center_lat) / 2) ** 2 +
+                 np.cos(lat) * math.cos(center_lat) * np.sin((long - center_long) / 2) ** 2)
+            distance = 2 * _EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+            return distance <= float(entry['radius'])
+
+        if field in ('last_session', 'first_session'):
+            column = self._number_column('last_active' if field == 'last_session' else 'created_at')
+            return _COMPARISONS[relation]((now - column) / 3600.0, float(value))
+
+        if field in self._fields:
+            return _COMPARISONS[relation](self._number_column(self._fields[field]), float(value))
+
+        if field in ('language', 'country'):
+            return PlayerIndex._match_strings(self._string_column(field), relation, value)
+
+        if field == 'app_version':
+            return PlayerIndex._match_strings(self._string_column('game_version'),
+                                              relation, value, version=True)
+
+        if field == 'tag':
+            return PlayerIndex._match_strings(self._tag_column(entry['key']),
+                                              relation, value, numeric=True)
+
+        raise Exception('Filter field {} cannot be evaluated locally'.format(field))
+
+    def evaluate(self, filters, now: float = None):
+        """
+        evaluate a filter expression, AND binding tighter than OR as on the api
+        :param filters: Filter instance or its list of entries
+        :param now: unix time last_session and first_session are relative to, defaults to now
+        :return: boolean numpy mask over the players
+        """
+        entries = filters.data if isinstance(filters, Filter) else filters
+        now = time.time() if now is None else now
+
+        result = np.zeros(len(self._ids), dtype=bool)
+        group = None
+        for entry in entries + [{'operator': 'OR'}]:
+            operator = entry.get('operator')
+            if operator == 'OR':
+                if group is not None:
+                    result |= group
+                group = None
+            elif operator is None:
+                condition = self._condition(entry, now)
+                group = condition if group is None else group & condition
+        return result
+
+    def match(self, filters, now: float = None):
+        """
+        :param filters: Filter instance or its list of entries
+        :param now: unix time last_session and first_session are relative to
+        :return: numpy array of the matching player ids
+        """
+        return self._ids[self.evaluate(filters, now)]
+
+    def count(self, filters, now: float = None):
+        """
+        :param filters: Filter instance or its list of entries
+        :param now: unix time last_session and first_session are relative to
+        :return: number of matching players
+        """
+        return int(np.count_nonzero(self.evaluate(filters, now)))
+
+    def target_devices(self, filters, chunk_size: int = _PLAYER_ID_LIMIT, now: float = None):
+        """
+        :param filters: Filter instance or its list of entries
+        :param chunk_size: maximum number of player ids per batch
+        :param now: unix time last_session and first_session are relative to
+        :return: generator of TargetDevice instances covering the matching players
+        """
+        player_ids = self.match(filters, now)
+        for start in range(0, len(player_ids), chunk_size):
+            yield TargetDevice().include_player_ids(player_ids[start:start + chunk_size].tolist())
+
+
+class CircuitOpenError(Exception):
+    """ Raised while the circuit breaker is shedding load """
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the api is unhealthy. After failure_threshold consecutive
+    failures the circuit opens and every call is rejected until recovery_time
+    has elapsed, then a single probe request decides whether it closes again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30.0):
+        """
+        :param failure_threshold: consecutive failures before the circuit opens
+        :param recovery_time: seconds to wait before probing the api again
+        """
+        self._failure_threshold = failure_threshold
+        self._recovery_time = recovery_time
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """ :return: 'closed', 'open' or 'half-open' """
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self._recovery_time:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """ raise CircuitOpenError unless a request may go through """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            remaining = self._recovery_time - (time.monotonic() - self._opened_at)
+            if remaining <= 0 and not self._probing:
+                self._probing = True
+                return True
+        raise CircuitOpenError('OneSignal api is unavailable, retry in {:.1f}s'
+                               .format(max(remaining, 0)))
+
+    def record_success(self):
+        """ close the circuit after a healthy response """
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        """ count a failed request and open the circuit when needed """
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+def _is_overload(error: Exception):
+    """ :return: True when an error means the api is throttling or struggling """
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, CircuitOpenError))
+
+
+class AdaptiveLimit:
+    """
+    Concurrency limit tuned from observed latency. The limit grows while the
+    recent latency stays close to the best latency seen, shrinks in proportion
+    when latency rises, and is cut multiplicatively on throttling or errors,
+    at most once per round trip.
+    """
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 256,
+                 tolerance: float = 1.5, backoff: float = 0.7, smoothing: float = 0.2,
+                 history: int = 1000):
+        """
+        :param initial: starting number of requests in flight
+        :param min_limit: lowest limit
+        :param max_limit: highest limit, also the size of the sending thread pool
+        :param tolerance: latency increase over the baseline accepted before shrinking
+        :param backoff: factor applied to the limit on throttling or errors
+        :param smoothing: weight of each new estimate when the limit shrinks
+        :param history: number of limit changes kept for metrics
+        """
+        self._limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self._tolerance = tolerance
+        self._backoff = backoff
+        self._smoothing = smoothing
+        self._baseline = None
+        self._recent = None
+        self._samples = 0
+        self._dropped = 0
+        self._decreased_at = None
+        self._history = deque([(time.time(), int(initial))], maxlen=history)
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        """ :return: current number of requests allowed in flight """
+        return int(self._limit)
+
+    def record(self, latency: float, dropped: bool = False):
+        """
+        feed the outcome of a request
+        :param latency: seconds the request took
+        :param dropped: True when the api throttled (429) or failed the request
+        """
+        # coarse clocks report fast responses as 0, which would zero the gradient's divisor
+        latency = max(latency, 1e-6)
+        now = time.monotonic()
+        with self._lock:
+            previous = int(self._limit)
+            self._samples += 1
+            if dropped:
+                self._dropped += 1
+                # requests already in flight at the last cut report the same congestion
+                if self._decreased_at is None or now - latency >= self._decreased_at:
+                    self._limit = max(self.min_limit, self._limit * self._backoff)
+                    self._decreased_at = now
+            else:
+                self._recent = latency if self._recent is None else 0.8 * self._recent + 0.2 * latency
+                # the baseline follows new lows at once and drifts up slowly
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    self._baseline += (latency - self._baseline) * 0.01
+
+                gradient = max(0.5, min(1.0, self._tolerance * self._baseline / self._recent))
+                estimate = self._limit * gradient + self._limit ** 0.5
+                if estimate > self._limit:
+                    # grow by about sqrt(limit) per round trip rather than per response
+                    self._limit += (estimate - self._limit) / self._limit
+                else:
+                    self._limit += (estimate - self._limit) * self._smoothing
+                self._limit = max(self.min_limit, min(self.max_limit, self._limit))
+
+            if int(self._limit) != previous:
+                self._history.append((time.time(), int(self._limit)))
+
+    @property
+    def history(self):
+        """ :return: list of (timestamp, limit) changes """
+        with self._lock:
+            return list(self._history)
+
+    def metrics(self):
+        """ :return: current limit and the latency estimates driving it """
+        with self._lock:
+            return {'limit': int(self._limit), 'baseline_latency': self._baseline,
+                    'recent_latency': self._recent, 'samples': self._samples,
+                    'dropped': self._dropped}
+
+
+class RateLimiter:
+    """ Token bucket limiting how many requests are started per second """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        :param rate: requests per second
+        :param burst: maximum number of requests started back to back
+        """
+        if rate <= 0:
+            raise Exception('rate must be positive')
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ block until a request may be started """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self._rate
+            time.sleep(delay)
+
+    def limit(self, items):
+        """
+        :param items: iterable to pace
+        :return: generator yielding items no faster than the rate allows
+        """
+        for item in items:
+            self.acquire()
+            yield item
+
+
+class _LatencyWindow:
+    """ Rolling window of observed request latencies """
+
+    def __init__(self, size: int = 256, min_samples: int = 20):
+        self._samples = deque(maxlen=size)
+        self._min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        """
+        :param q: percentile between 0 and 1
+        :return: latency in seconds or None while there are too few samples
+        """
+        with self._lock:
+            if len(self._samples) < self._min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class Response:
+    """ Transport independent http response """
+
+    __slots__ = ('status_code', 'content', 'url')
+
+    def __init__(self, status_code: int, content: bytes, url: str):
+        self.status_code = status_code
+        self.content = content
+        self.url = url
+
+    def json(self):
+        """ :return: decoded json body """
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        """ raise requests.HTTPError for 4xx and 5xx responses """
+        if self.status_code >= 400:
+            raise requests.HTTPError('{} Error for url: {}'.format(self.status_code, self.url),
+                                     response=self)
+
+
+class Transport:
+    """
+    Http layer used by OneSignal. Implementations must be thread safe and
+    raise requests.ConnectionError or requests.Timeout on network failures.
+    """
+
+    def request(self, method: str, url: str, headers: dict,
+                body: bytes = None, timeout=None):
+        """
+        :param method: http method
+        :param url: endpoint url
+        :param headers: request headers
+        :param body: optional request body
+        :param timeout: seconds, or a (connect, read) tuple
+        :return: Response instance
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ release pooled connections """
+
+
+class RequestsTransport(Transport):
+    """ HTTP/1.1 keep-alive transport backed by a requests session """
+
+    def __init__(self, pool_size: int = 32):
+        """
+        :param pool_size: maximum number of connections kept alive per host
+        """
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size,
+                                                pool_maxsize=pool_size)
+        self._session = requests.Session()
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def request(self, method: str, url: str, headers: dict,
+                body: bytes = None, timeout=None):
+        response = self._session.request(method, url, data=body,
+                                         headers=headers, timeout=timeout)
+        return Response(response.status_code, response.content, url)
+
+    def close(self):
+        self._session.close()
+
+
+class Http2Transport(Transport):
+    """
+    HTTP/2 transport multiplexing concurrent requests over a few connections.
+    Requests from any thread are funneled into a single event loop owning the
+    connections, so the sync and the concurrent send paths share the same streams.
+    Requires httpx with http2 support: pip install httpx[http2]
+    """
+
+    def __init__(self, max_connections: int = 2, prior_knowledge: bool = False):
+        """
+        :param max_connections: maximum number of connections per host
+        :param prior_knowledge: talk HTTP/2 without negotiation, needed for
+        cleartext (h2c) endpoints such as a local stand-in server
+        """
+        if httpx is None:
+            raise Exception('Http2Transport requires httpx, install it with: pip install httpx[http2]')
+
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections)
+        self._client = httpx.AsyncClient(http1=not prior_knowledge, http2=True, limits=limits)
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+
+    @staticmethod
+    def _timeout(timeout):
+        """ :return: httpx timeout from a requests style timeout """
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return httpx.Timeout(read, connect=connect, pool=connect + read)
+        return httpx.Timeout(timeout)
+
+    async def _request(self, method: str, url: str, headers: dict, body: bytes, timeout):
+        try:
+            response = await self._client.request(method, url, content=body, headers=headers,
+                                                  timeout=Http2Transport._timeout(timeout))
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e))
+        return Response(response.status_code, response.content, url)
+
+    def request(self, method: str, url: str, headers: dict,
+                body: bytes = None, timeout=None):
+        request = self._request(method, url, headers, body, timeout)
+        return asyncio.run_coroutine_threadsafe(request, self._loop).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class RecordingTransport(Transport):
+    """
+    Append every outgoing request to a JSON lines log (gzip compressed when the
+    path ends with .gz), either forwarding it to another transport or, without
+    one, answering locally for dry runs. Authorization headers are never written.
+    """
+
+    _secret_headers = ('authorization',)
+
+    def __init__(self, path: str, transport: Transport = None):
+        """
+        :param path: log file, appended to when it already exists
+        :param transport: optional transport actually sending the requests
+        """
+        self._transport = transport
+        self._file = gzip.open(path, 'ab') if path.endswith('.gz') else open(path, 'ab')
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, headers: dict,
+                body: bytes = None, timeout=None):
+        started = time.time()
+        response = None
+        try:
+            if self._transport is None:
+                response = Response(200, b'{"id": "", "recipients": 0}', url)
+            else:
+                response = self._transport.request(method, url, headers, body, timeout)
+            return response
+        finally:
+            record = {'t': started, 'm': method, 'u': url,
+                      'h': {key: value for key, value in headers.items()
+                            if key.lower() not in self._secret_headers},
+                      'b': body.decode('utf-8') if body else None,
+                      'd': round(time.time() - started, 6),
+                      's': response.status_code if response is not None else None}
+            line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+            with self._lock:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        if self._transport is not None:
+            self._transport.close()
+
+
+class Replayer:
+    """ Re-issue requests captured by RecordingTransport """
+
+    def __init__(self, path: str):
+        """
+        :param path: log written by RecordingTransport
+        """
+        self._path = path
+
+    def records(self):
+        """
+        :return: generator of recorded requests, logs of runs that were killed
+        end at their last complete record
+        """
+        opener = gzip.open if self._path.endswith('.gz') else open
+        with opener(self._path, 'rb') as f:
+            try:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # the record being written when the run stopped
+                        return
+                    if line.strip():
+                        yield json.loads(line)
+            except EOFError:
+                # gzip logs that were never closed have no end-of-stream marker
+                return
+
+    @staticmethod
+    def _target(url: str, endpoint: str):
+        """ :return: recorded url moved to another scheme and host """
+        if endpoint is None:
+            return url
+        target = urlsplit(endpoint)
+        return urlunsplit(urlsplit(url)._replace(scheme=target.scheme, netloc=target.netloc))
+
+    def replay(self, endpoint: str = None, speed: float = 1.0, api_key: str = None,
+               transport: Transport = None, workers: int = 32, timeout=(5, 30)):
+        """
+        :param endpoint: scheme and host to send to, such as http://127.0.0.1:8080,
+        defaults to the recorded urls
+        :param speed: 1 replays at the recorded pace, N at N times that pace
+        and None as fast as the workers allow
+        :param api_key: optional rest api key sent as the Authorization header
+        :param transport: http layer, defaults to a RequestsTransport
+        :param workers: maximum number of requests in flight
+        :param timeout: seconds, or a (connect, read) tuple, per request
+        :return: dict of replay statistics
+        """
+        owned = transport is None
+        transport = RequestsTransport(pool_size=workers) if owned else transport
+        stats = {'requests': 0, 'errors': 0, 'statuses': {}, 'max_lag': 0.0}
+
+        def send(record):
+            headers = dict(record['h'])
+            if api_key is not None:
+                headers['Authorization'] = 'Basic {}'.format(api_key)
+            body = record['b'].encode('utf-8') if record['b'] is not None else None
+            url = Replayer._target(record['u'], endpoint)
+            return transport.request(record['m'], url, headers, body, timeout).status_code
+
+        def collect(done):
+            for future in done:
+                if future.exception() is not None:
+                    stats['errors'] += 1
+                else:
+                    status = future.result()
+                    stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+
+        first = None
+        started = time.monotonic()
+        pending = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for record in self.records():
+                if speed is not None:
+                    first = record['t'] if first is None else first
+                    delay = started + (record['t'] - first) / speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    stats['max_lag'] = max(stats['max_lag'], -delay)
+
+                if len(pending) >= workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending.add(pool.submit(send, record))
+                stats['requests'] += 1
+            collect(wait(pending).done)
+
+        if owned:
+            transport.close()
+        stats['elapsed'] = time.monotonic() - started
+        return stats
 
 
 class OneSignal:
     _url = 'https://onesignal.com/api/v1/notifications'
 
-    def __init__(self, app_id: str, api_key: str):
+    def __init__(self, app_id: str, api_key: str, timeout=(5, 30),
+                 breaker: CircuitBreaker = None, hedge: bool = False,
+                 hedge_workers: int = 16, transport: Transport = None,
+                 url: str = None):
         """
         Initiate a new notification center
         For app_id and api_key refer to: https://goo.gl/NzpytH
         :param app_id: onesignal's app id
         :param api_key: onesignal's rest api key
+        :param timeout: seconds, or a (connect, read) tuple, before a request is abandoned
+        :param breaker: optional circuit breaker shared by every request
+        :param hedge: duplicate idempotent requests (get, cancel) that take
+        longer than the observed p95 latency and use the first answer
+        :param hedge_workers: size of the thread pool used by hedged requests
+        :param transport: http layer, defaults to a RequestsTransport
+        :param url: optional notifications endpoint replacing the public api
         """
         self._app_id = app_id
         self._api_key = api_key
+        self._url = url if url is not None else OneSignal._url
+        self._timeout = timeout
+        self._breaker = breaker
+        # hedge delays come from the latency of the same method only,
+        # slower non-hedged posts must not inflate them
+        self._latency = {'GET': _LatencyWindow(), 'DELETE': _LatencyWindow()}
+        self._transport = transport if transport is not None else RequestsTransport()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers) if hedge else None
 
     @staticmethod
     def _create_header(api_key):
@@ -837,42 +2261,93 @@ class OneSignal:
             "Authorization": "Basic {}".format(api_key)
         }
 
-    @staticmethod
-    def _get(url: str, headers: dict):
+    def _send(self, method: str, url: str, headers: dict, payload=None):
         """
-        make a get request
+        make a single request through the circuit breaker
+        :param method: http method
         :param url: endpoint url
         :param headers: request headers
+        :param payload: request payload, either a dict or pre-serialized json bytes
         :return: json data
         """
-        response = requests.get(url, headers=headers)
+        if payload is not None and not isinstance(payload, bytes):
+            payload = _to_json(payload).encode()
+
+        if self._breaker is not None:
+            self._breaker.allow()
+
+        healthy = False
+        start = time.monotonic()
+        try:
+            response = self._transport.request(method, url, headers, payload, self._timeout)
+            if method in self._latency:
+                self._latency[method].add(time.monotonic() - start)
+            # throttling and server errors mean the api is struggling
+            healthy = response.status_code != 429 and response.status_code < 500
+        finally:
+            # every outcome is recorded, a probe must never stay in flight
+            if self._breaker is not None:
+                if healthy:
+                    self._breaker.record_success()
+                else:
+                    self._breaker.record_failure()
+
         response.raise_for_status()
         return response.json()
 
-    @staticmethod
-    def _post(url: str, headers: dict, payload: dict):
+    def _hedged(self, method: str, url: str, headers: dict):
+        """
+        make an idempotent request, sending a duplicate when the first one
+        takes longer than the observed p95 latency
+        :param method: http method
+        :param url: endpoint url
+        :param headers: request headers
+        :return: json data of the first successful response
+        """
+        delay = self._latency[method].percentile(0.95)
+        if self._hedge_pool is None or delay is None:
+            return self._send(method, url, headers)
+
+        primary = self._hedge_pool.submit(self._send, method, url, headers)
+        if wait([primary], timeout=delay).done:
+            return primary.result()
+
+        error = None
+        hedge = self._hedge_pool.submit(self._send, method, url, headers)
+        for future in as_completed([primary, hedge]):
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+        raise error
+
+    def _get(self, url: str, headers: dict):
+        """
+        make a get request
+        :param url: endpoint url
+        :param headers: request headers
+        :return: json data
+        """
+        return self._hedged('GET', url, headers)
+
+    def _post(self, url: str, headers: dict, payload):
         """
         make a post request
         :param url: endpoint url
         :param headers: request headers
-        :param payload: request payload
+        :param payload: request payload, either a dict or pre-serialized json bytes
         :return: json data
         """
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return self._send('POST', url, headers, payload)
 
-    @staticmethod
-    def _delete(url: str, headers: dict):
+    def _delete(self, url: str, headers: dict):
         """
         make a delete request
         :param url: endpoint url
         :param headers: request headers
         :return: json data
         """
-        response = requests.delete(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return self._hedged('DELETE', url, headers)
 
     def post(self, notification: Notification):
         """
@@ -883,7 +2358,88 @@ class OneSignal:
         payload = notification.data
         payload['app_id'] = self._app_id
         headers = OneSignal._create_header(self._api_key)
-        return OneSignal._post(self._url, headers, payload)
+        return self._post(self._url, headers, payload)
+
+    def post_body(self, body: bytes):
+        """
+        submit a pre-serialized notification, such as the ones
+        generated by BulkNotification.payloads, to the api
+        :param body: json encoded notification without the app id
+        :return: (not decided yet)
+        """
+        app_id = '{{"app_id":{}'.format(json.dumps(self._app_id)).encode()
+        payload = app_id + (b',' + body[1:] if len(body) > 2 else b'}')
+        headers = OneSignal._create_header(self._api_key)
+        return self._post(self._url, headers, payload)
+
+    def _post_item(self, item):
+        """ submit either a Notification or a pre-serialized body """
+        if isinstance(item, bytes):
+            return self.post_body(item)
+        return self.post(item)
+
+    def _post_timed(self, item, limit):
+        """ submit an item, reporting its latency to an AdaptiveLimit """
+        start = time.monotonic()
+        try:
+            response = self._post_item(item)
+        except Exception as e:
+            limit.record(time.monotonic() - start, dropped=_is_overload(e))
+            raise
+        limit.record(time.monotonic() - start)
+        return response
+
+    def post_many(self, notifications, workers=8):
+        """
+        submit notifications concurrently, reading the iterable lazily so at
+        most `workers` requests are in flight at any time
+        :param notifications: iterable of Notification instances or
+        pre-serialized bodies from BulkNotification.payloads
+        :param workers: number of concurrent requests, or an AdaptiveLimit
+        tuning it from observed latency and throttling
+        :return: generator of (index, response, error) tuples in completion order
+        """
+        adaptive = isinstance(workers, AdaptiveLimit)
+        source = enumerate(notifications)
+        exhausted = False
+        pending = {}
+        with ThreadPoolExecutor(max_workers=workers.max_limit if adaptive else workers) as pool:
+            while True:
+                while not exhausted and len(pending) < (workers.limit if adaptive else workers):
+                    try:
+                        index, item = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if adaptive:
+                        pending[pool.submit(self._post_timed, item, workers)] = index
+                    else:
+                        pending[pool.submit(self._post_item, item)] = index
+
+                if not pending:
+                    return
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    error = future.exception()
+                    yield index, None if error else future.result(), error
+
+    def close(self):
+        """ release the transport's connections and the hedging threads """
+        self._transport.close()
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+
+    def get(self, notification_id: str):
+        """
+        view the details of a notification using its notification id
+        :param notification_id: notification's id
+        :return: notification details
+        """
+        headers = OneSignal._create_header(self._api_key)
+        url = self._url + "/{}?app_id={}".format(notification_id, self._app_id)
+        return self._get(url, headers)
 
     def cancel(self, notification_id: str):
         """
@@ -892,5 +2448,5 @@ class OneSignal:
         :return: (not decided yet)
         """
         headers = OneSignal._create_header(self._api_key)
-        url = self._url + "{}?app_id=[}".format(notification_id, self._app_id)
-        return OneSignal._delete(url, headers)
\ No newline at end of file
+        url = self._url + "/{}?app_id={}".format(notification_id, self._app_id)
+        return self._delete(url, headers)
\ No newline at end of file
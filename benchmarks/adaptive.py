@@ -0,0 +1,46 @@
+"""
+Fixed worker counts versus AdaptiveLimit against a stand-in server whose
+latency grows with load and which throttles requests above its capacity.
+Run from the repository root: python -m benchmarks.adaptive
+"""
+import argparse
+import time
+
+from SignalPy import AdaptiveLimit, LangCodes, Notification, OneSignal
+from benchmarks.standin import StandInServer
+
+
+def run(workers, count: int, latency: float, capacity: int):
+    server = StandInServer(latency=latency, capacity=capacity).start()
+    client = OneSignal('app-id', 'api-key', url=server.url)
+    notifications = (Notification().add_content(LangCodes.English, 'message {}'.format(i))
+                     for i in range(count))
+    start = time.perf_counter()
+    errors = sum(1 for _, _, error in client.post_many(notifications, workers=workers) if error)
+    elapsed = time.perf_counter() - start
+    client.close()
+    server.stop()
+    return count / elapsed, errors, server.stats.throttled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=3000)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--capacity', type=int, default=32)
+    args = parser.parse_args()
+
+    for workers in (4, 16, 64, 128):
+        rate, errors, throttled = run(workers, args.count, args.latency, args.capacity)
+        print('fixed {:>3} workers  {:>7.0f} req/s  {:>5} errors  {:>5} throttled'.format(
+            workers, rate, errors, throttled))
+
+    limit = AdaptiveLimit()
+    rate, errors, throttled = run(limit, args.count, args.latency, args.capacity)
+    print('adaptive limit     {:>7.0f} req/s  {:>5} errors  {:>5} throttled  final limit {}'.format(
+        rate, errors, throttled, limit.limit))
+    print('limit history', [value for _, value in limit.history])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Build personalised payloads for one row per user with language, title and body
+columns: the per-row Notification builder loop versus BulkNotification.payloads.
+Run from the repository root: python -m benchmarks.bulk_builder
+"""
+import argparse
+import json
+import time
+
+from SignalPy import BulkNotification, Notification
+
+_LANGUAGES = ('en', 'de', 'fr', 'es', 'it', 'pt', 'ja', 'ko')
+
+
+def columns(count: int, distinct: int):
+    return {'player_id': ['player-{}'.format(i) for i in range(count)],
+            'language': [_LANGUAGES[i % len(_LANGUAGES)] for i in range(count)],
+            'title': ['Hello user {}'.format(i % distinct) for i in range(count)],
+            'body': ['You have {} new messages waiting'.format(i % distinct) for i in range(count)]}
+
+
+def builder_loop(data: dict):
+    bodies = []
+    for player_id, lang, title, body in zip(data['player_id'], data['language'],
+                                            data['title'], data['body']):
+        notification = Notification().add_content(lang, body).add_heading(lang, title)
+        notification.data['include_player_ids'] = [player_id]
+        bodies.append(notification.to_json().encode())
+    return bodies
+
+
+def dict_loop(data: dict):
+    return [json.dumps({'contents': {lang: body}, 'headings': {lang: title},
+                        'include_player_ids': [player_id]}).encode()
+            for player_id, lang, title, body in zip(data['player_id'], data['language'],
+                                                    data['title'], data['body'])]
+
+
+def bulk(data: dict):
+    builder = BulkNotification(data, {'contents': 'body', 'headings': 'title'},
+                               player_ids='player_id', language='language')
+    return [body for body, _ in builder.payloads()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--distinct', type=int, default=None,
+                        help='distinct title/body pairs, every row is unique by default')
+    args = parser.parse_args()
+    data = columns(args.count, args.distinct or args.count)
+
+    timings = {}
+    for name, build in (('Notification builder loop', builder_loop),
+                        ('dict + json.dumps loop', dict_loop),
+                        ('BulkNotification.payloads', bulk)):
+        start = time.perf_counter()
+        bodies = build(data)
+        timings[name] = time.perf_counter() - start
+        print('{:<26} {:>7.2f}s  {} payloads'.format(name, timings[name], len(bodies)))
+    print('speedup over the builder loop {:.1f}x'.format(
+        timings['Notification builder loop'] / timings['BulkNotification.payloads']))
+
+
+if __name__ == '__main__':
+    main()
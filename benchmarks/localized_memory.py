@@ -0,0 +1,73 @@
+"""
+Memory and serialization cost of a large notification queue reusing the same
+translations, with one dict per notification versus shared LocalizedText.
+Run from the repository root: python -m benchmarks.localized_memory
+"""
+import argparse
+import tracemalloc
+import json
+import time
+
+from SignalPy import LocalizedText, Notification
+
+
+def translations(languages: list, prefix: str):
+    return {lang: '{} message in {} with some realistic length to it'.format(prefix, lang)
+            for lang in languages}
+
+
+def dict_queue(count: int, contents: dict, headings: dict):
+    """ notifications each owning their own copy, as the builder used to produce """
+    queue = []
+    for i in range(count):
+        payload = {'contents': dict(contents), 'headings': dict(headings),
+                   'include_player_ids': ['player-{}'.format(i)]}
+        queue.append(payload)
+    return queue, lambda payload: json.dumps(payload)
+
+
+def localized_queue(count: int, contents: dict, headings: dict):
+    contents, headings = LocalizedText(contents), LocalizedText(headings)
+    queue = []
+    for i in range(count):
+        notification = Notification().add_contents(contents).add_headings(headings)
+        notification.data['include_player_ids'] = ['player-{}'.format(i)]
+        queue.append(notification)
+    return queue, lambda notification: notification.to_json()
+
+
+def measure(build, count: int, contents: dict, headings: dict):
+    tracemalloc.start()
+    queue = build(count, contents, headings)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del queue
+
+    start = time.perf_counter()
+    queue, serialize = build(count, contents, headings)
+    built = time.perf_counter() - start
+
+    start = time.perf_counter()
+    size = sum(len(serialize(item)) for item in queue)
+    return memory, built, time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--languages', type=int, default=40)
+    args = parser.parse_args()
+
+    with open('lang_codes.json', 'r') as f:
+        languages = list(json.load(f))[:args.languages]
+    contents, headings = translations(languages, 'Body'), translations(languages, 'Title')
+
+    for name, build in (('dict per notification', dict_queue),
+                        ('shared LocalizedText', localized_queue)):
+        memory, built, serialized, size = measure(build, args.count, contents, headings)
+        print('{:<22} {:>8.1f} MiB  build {:>6.2f}s  serialize {:>6.2f}s  {} MiB of json'.format(
+            name, memory / 2 ** 20, built, serialized, size // 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
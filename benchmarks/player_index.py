@@ -0,0 +1,106 @@
+"""
+Count a combined segment over a synthetic player index, the way a campaign
+preview would, and compare against a plain python scan of the same records.
+Run from the repository root: python -m benchmarks.player_index
+"""
+import argparse
+import tempfile
+import time
+import os
+
+import numpy as np
+
+from SignalPy import Filter, PlayerIndex, Relation
+
+_LANGUAGES = ('en', 'de', 'fr', 'es', 'it', 'pt', 'ja', 'ko', 'zh-Hans', 'ru')
+_COUNTRIES = ('US', 'DE', 'FR', 'ES', 'IT', 'BR', 'JP', 'KR', 'CN', 'RU')
+_VERSIONS = ('1.0.0', '1.2.0', '1.10.0', '2.0.1', '2.1.0')
+_TIERS = ('free', 'silver', 'gold')
+
+
+def synthetic(count: int, now: float):
+    random = np.random.default_rng(7)
+    tiers = random.integers(0, len(_TIERS), count)
+    levels = random.integers(1, 100, count)
+    return {
+        'id': np.array(['player-{}'.format(i) for i in range(count)], dtype=object),
+        'session_count': random.integers(1, 500, count).astype(float),
+        'playtime': random.exponential(3600.0, count),
+        'amount_spent': np.round(random.exponential(5.0, count), 2),
+        'last_active': now - random.exponential(24 * 3600.0 * 7, count),
+        'created_at': now - random.uniform(0, 24 * 3600.0 * 365, count),
+        'lat': random.uniform(-60, 70, count),
+        'long': random.uniform(-180, 180, count),
+        'language': np.array(_LANGUAGES)[random.integers(0, len(_LANGUAGES), count)],
+        'country': np.array(_COUNTRIES)[random.integers(0, len(_COUNTRIES), count)],
+        'game_version': np.array(_VERSIONS)[random.integers(0, len(_VERSIONS), count)],
+        'tags': [{'tier': _TIERS[tier], 'level': str(level)} for tier, level in zip(tiers, levels)],
+    }
+
+
+def segment():
+    return (Filter()
+            .last_session(Relation.LowerThan, 72).session_count(Relation.GreaterThan, 10)
+            .tag('tier', Relation.Equal, 'gold').app_version(Relation.GreaterThan, '1.2.0')
+            .or_
+            .location(500000, 48.85, 2.35).amount_spent(Relation.GreaterThan, 20))
+
+
+def scan(columns: dict, now: float):
+    """ the same segment evaluated one player at a time """
+    count = 0
+    for i in range(len(columns['id'])):
+        tags = columns['tags'][i]
+        version = tuple(int(part) for part in columns['game_version'][i].split('.'))
+        first = ((now - columns['last_active'][i]) / 3600 < 72 and columns['session_count'][i] > 10
+                 and tags.get('tier') == 'gold' and version > (1, 2, 0))
+        lat, long = np.radians(columns['lat'][i]), np.radians(columns['long'][i])
+        a = (np.sin((lat - np.radians(48.85)) / 2) ** 2 + np.cos(lat) * np.cos(np.radians(48.85)) *
+             np.sin((long - np.radians(2.35)) / 2) ** 2)
+        second = (2 * 6371008.8 * np.arcsin(np.sqrt(a)) <= 500000
+                  and columns['amount_spent'][i] > 20)
+        count += bool(first or second)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=2000000)
+    parser.add_argument('--scan', type=int, default=100000,
+                        help='players scanned by the python baseline')
+    args = parser.parse_args()
+
+    now = time.time()
+    columns = synthetic(args.count, now)
+    index = PlayerIndex(columns)
+    filters = segment()
+
+    start = time.perf_counter()
+    matched = index.count(filters, now=now)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    index.count(filters, now=now)
+    cached = time.perf_counter() - start
+    print('{} players, {} matched: first count {:.3f}s (parses tags), cached {:.3f}s'.format(
+        args.count, matched, first, cached))
+
+    path = os.path.join(tempfile.mkdtemp(), 'players.npz')
+    start = time.perf_counter()
+    index.save(path)
+    saved = time.perf_counter() - start
+    start = time.perf_counter()
+    PlayerIndex.load(path)
+    print('save {:.2f}s, load {:.2f}s, {:.1f} MiB on disk'.format(
+        saved, time.perf_counter() - start, os.path.getsize(path) / 2 ** 20))
+
+    sample = {name: column[:args.scan] for name, column in columns.items()}
+    start = time.perf_counter()
+    expected = scan(sample, now)
+    baseline = time.perf_counter() - start
+    assert expected == PlayerIndex(sample).count(filters, now=now)
+    print('python scan of {} players {:.2f}s, about {:.1f}s for the whole index'.format(
+        args.scan, baseline, baseline * args.count / args.scan))
+
+
+if __name__ == '__main__':
+    main()
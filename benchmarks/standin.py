@@ -0,0 +1,202 @@
+"""
+Local stand-in for the OneSignal notifications api, used by the benchmarks.
+Both servers answer like the real api and count requests and connections.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import asyncio
+import uuid
+import json
+import time
+
+
+class _Stats:
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self, capacity: int):
+        """ :return: False when the request is over capacity """
+        with self._lock:
+            if capacity is not None and self.in_flight >= capacity:
+                self.throttled += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def requested(self):
+        with self._lock:
+            self.requests += 1
+
+
+def _respond(method: str, path: str, body: bytes):
+    """
+    :return: (status, json body) the api would answer with
+    """
+    if method == 'POST':
+        payload = json.loads(body or b'{}')
+        recipients = len(payload.get('include_player_ids') or [None])
+        return 200, json.dumps({'id': str(uuid.uuid4()), 'recipients': recipients}).encode()
+    if method == 'DELETE':
+        return 200, b'{"success": true}'
+    notification_id = path.split('?')[0].rsplit('/', 1)[-1]
+    return 200, json.dumps({'id': notification_id}).encode()
+
+
+class StandInServer:
+    """ HTTP/1.1 stand-in server """
+
+    def __init__(self, latency: float = 0.0, port: int = 0, capacity: int = None):
+        """
+        :param latency: seconds to wait before answering each request
+        :param port: port to listen on, 0 picks a free one
+        :param capacity: optional number of concurrent requests served, past half
+        of it latency grows with load and above it requests get 429 responses
+        """
+        self.stats = _Stats()
+        stats = self.stats
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                stats.connected()
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                stats.requested()
+                if stats.enter(capacity):
+                    load = stats.in_flight * 2 / capacity if capacity else 1
+                    time.sleep(latency * max(1.0, load))
+                    status, content = _respond(self.command, self.path, body)
+                    stats.leave()
+                else:
+                    status, content = 429, b'{"errors": ["Rate limit exceeded"]}'
+
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_DELETE = _handle
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        """ :return: notifications endpoint of this server """
+        return 'http://127.0.0.1:{}/api/v1/notifications'.format(self._server.server_port)
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _H2Protocol(asyncio.Protocol):
+    def __init__(self, latency: float, stats: _Stats):
+        import h2.config
+        import h2.connection
+
+        config = h2.config.H2Configuration(client_side=False, header_encoding='utf-8')
+        self._connection = h2.connection.H2Connection(config=config)
+        self._latency = latency
+        self._stats = stats
+        self._streams = {}
+        self._transport = None
+
+    def connection_made(self, transport):
+        self._stats.connected()
+        self._transport = transport
+        self._connection.initiate_connection()
+        self._transport.write(self._connection.data_to_send())
+
+    def data_received(self, data: bytes):
+        import h2.events
+
+        for event in self._connection.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                self._streams[event.stream_id] = (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                self._streams[event.stream_id][1].extend(event.data)
+                self._connection.acknowledge_received_data(event.flow_controlled_length,
+                                                           event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                self._stats.requested()
+                loop = asyncio.get_event_loop()
+                loop.call_later(self._latency, self._respond, event.stream_id)
+            elif isinstance(event, h2.events.StreamReset):
+                self._streams.pop(event.stream_id, None)
+        self._transport.write(self._connection.data_to_send())
+
+    def _respond(self, stream_id: int):
+        if stream_id not in self._streams or self._transport.is_closing():
+            return
+        headers, body = self._streams.pop(stream_id)
+        status, content = _respond(headers[':method'], headers[':path'], bytes(body))
+        self._connection.send_headers(stream_id, [(':status', str(status)),
+                                                  ('content-type', 'application/json'),
+                                                  ('content-length', str(len(content)))])
+        self._connection.send_data(stream_id, content, end_stream=True)
+        self._transport.write(self._connection.data_to_send())
+
+
+class H2StandInServer:
+    """ Cleartext HTTP/2 (h2c, prior knowledge) stand-in server, requires h2 """
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        """
+        :param latency: seconds to wait before answering each request
+        :param port: port to listen on, 0 picks a free one
+        """
+        self.stats = _Stats()
+        self._latency = latency
+        self._port = port
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+
+    @property
+    def url(self):
+        """ :return: notifications endpoint of this server """
+        port = self._server.sockets[0].getsockname()[1]
+        return 'http://127.0.0.1:{}/api/v1/notifications'.format(port)
+
+    def start(self):
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(self._loop.create_server(
+                lambda: _H2Protocol(self._latency, self.stats), '127.0.0.1', self._port))
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        started.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
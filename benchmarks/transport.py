@@ -0,0 +1,41 @@
+"""
+Compare the requests (HTTP/1.1) and HTTP/2 transports against local stand-in servers.
+Run from the repository root: python -m benchmarks.transport
+"""
+import argparse
+import time
+
+from SignalPy import Http2Transport, LangCodes, Notification, OneSignal, RequestsTransport
+from benchmarks.standin import H2StandInServer, StandInServer
+
+
+def run(server, transport, count: int, workers: int):
+    client = OneSignal('app-id', 'api-key', transport=transport, url=server.url)
+    notifications = (Notification().add_content(LangCodes.English, 'message {}'.format(i))
+                     for i in range(count))
+    start = time.perf_counter()
+    errors = sum(1 for _, _, error in client.post_many(notifications, workers=workers) if error)
+    elapsed = time.perf_counter() - start
+    client.close()
+    server.stop()
+    return elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.02)
+    args = parser.parse_args()
+
+    cases = [('requests HTTP/1.1', StandInServer, lambda: RequestsTransport(pool_size=args.workers)),
+             ('httpx HTTP/2', H2StandInServer, lambda: Http2Transport(prior_knowledge=True))]
+    for name, server_class, transport in cases:
+        server = server_class(latency=args.latency).start()
+        elapsed, errors = run(server, transport(), args.count, args.workers)
+        print('{:<18} {:>8.0f} req/s  {:>4} connections  {} errors'.format(
+            name, args.count / elapsed, server.stats.connections, errors))
+
+
+if __name__ == '__main__':
+    main()
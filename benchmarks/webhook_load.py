@@ -0,0 +1,74 @@
+"""
+Drive the webhook EventReceiver with concurrent keep-alive clients posting
+display, click and dismiss callbacks, then report ingest rate and lag.
+Run from the repository root: python -m benchmarks.webhook_load
+"""
+import argparse
+import tempfile
+import sqlite3
+import asyncio
+import json
+import time
+import uuid
+import os
+
+from signalpy_webhooks import EventReceiver, SQLiteSink
+
+_EVENTS = ('notification.displayed', 'notification.clicked', 'notification.dismissed')
+
+
+def callback(notification_id: str, index: int):
+    body = json.dumps({'event': _EVENTS[index % 3], 'id': notification_id,
+                       'heading': 'Title', 'content': 'Body', 'userId': str(uuid.uuid4()),
+                       'url': 'https://example.com'}).encode()
+    return (b'POST /webhooks HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+
+
+async def client(port: int, requests: list):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    statuses = {}
+    for request in requests:
+        writer.write(request)
+        head = await reader.readuntil(b'\r\n\r\n')
+        status = head.split(b' ', 2)[1].decode()
+        statuses[status] = statuses.get(status, 0) + 1
+    writer.close()
+    return statuses
+
+
+async def main(args):
+    database = os.path.join(tempfile.mkdtemp(), 'events.db')
+    receiver = await EventReceiver(SQLiteSink(database), host='127.0.0.1', port=0,
+                                   batch_size=args.batch_size).start()
+
+    notification_ids = [str(uuid.uuid4()) for _ in range(100)]
+    for notification_id in notification_ids:
+        receiver.track({'id': notification_id, 'recipients': 1}, campaign='load-test')
+
+    per_client = args.count // args.clients
+    batches = [[callback(notification_ids[(c + i) % 100], i) for i in range(per_client)]
+               for c in range(args.clients)]
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client(receiver.port, batch) for batch in batches))
+    elapsed = time.perf_counter() - start
+    metrics = receiver.metrics()
+    await receiver.stop()
+
+    statuses = {}
+    for result in results:
+        for status, count in result.items():
+            statuses[status] = statuses.get(status, 0) + count
+    rows = sqlite3.connect(database).execute('SELECT count(*) FROM events').fetchone()[0]
+    print('{} callbacks from {} clients in {:.2f}s: {:.0f} events/s, statuses {}'.format(
+        per_client * args.clients, args.clients, elapsed, per_client * args.clients / elapsed, statuses))
+    print('rows stored {}, metrics before shutdown {}'.format(rows, metrics))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
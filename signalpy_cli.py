@@ -0,0 +1,385 @@
+"""
+signalpy command line interface
+
+Stream notifications from JSONL/CSV files (or stdin) to OneSignal:
+
+    python signalpy_cli.py send --notifications campaign.jsonl --concurrency 32
+    python signalpy_cli.py send --notifications campaign.jsonl --concurrency auto
+    python signalpy_cli.py send --template template.json --audience players.csv \
+        --rate 50 --checkpoint campaign.ckpt
+
+Capture traffic without sending it and replay it against a local stand-in:
+
+    python signalpy_cli.py send --notifications campaign.jsonl --dry-run --record campaign.log.gz
+    python signalpy_cli.py replay campaign.log.gz --endpoint http://127.0.0.1:8080 --speed 10
+
+Collect webhook callbacks into SQLite:
+
+    python signalpy_cli.py receive --sqlite events.db --port 8080
+
+Credentials are read from --app-id/--api-key or the ONESIGNAL_APP_ID and
+ONESIGNAL_API_KEY environment variables.
+"""
+import argparse
+import signal
+import json
+import csv
+import sys
+import os
+import io
+import time
+
+from SignalPy import AdaptiveLimit, Http2Transport, OneSignal, RateLimiter, RecordingTransport, \
+    Replayer, RequestsTransport, _PLAYER_ID_LIMIT
+
+
+def _open(path: str):
+    """ :return: text stream for a path, '-' reads stdin """
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _is_csv(path: str, fmt: str):
+    if fmt is not None:
+        return fmt == 'csv'
+    return path.lower().endswith('.csv')
+
+
+def _nest(row: dict):
+    """
+    turn a flat csv row into a notification payload, dotted columns
+    become nested maps and include_* columns are split on ';'
+    Example: {"contents.en": "Hi", "include_player_ids": "a;b"}
+    """
+    payload = {}
+    for column, value in row.items():
+        if value is None or value == '':
+            continue
+        if column.startswith('include_'):
+            value = [token for token in value.split(';') if token]
+        target = payload
+        *parents, key = column.split('.')
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[key] = value
+    return payload
+
+
+def read_notifications(path: str, fmt: str = None):
+    """
+    :param path: JSONL or CSV file holding one notification per line or row
+    :param fmt: 'jsonl' or 'csv', guessed from the extension by default
+    :return: generator of json bodies
+    """
+    with _open(path) as stream:
+        if _is_csv(path, fmt):
+            for row in csv.DictReader(stream):
+                yield json.dumps(_nest(row)).encode()
+        else:
+            for line in stream:
+                line = line.strip()
+                if line:
+                    yield line.encode()
+
+
+def read_audience(path: str, fmt: str = None, column: str = 'player_id'):
+    """
+    :param path: CSV file with a player id column, JSONL file of
+    {"player_id": ...} objects or plain text with one id per line
+    :param fmt: 'jsonl', 'csv' or 'text', guessed from the extension by default
+    :param column: name of the player id column or key
+    :return: generator of player ids
+    """
+    with _open(path) as stream:
+        if _is_csv(path, fmt):
+            for row in csv.DictReader(stream):
+                if row.get(column):
+                    yield row[column]
+            return
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line)[column] if line.startswith('{') else line
+
+
+def chunk_audience(template: dict, player_ids, chunk_size: int = _PLAYER_ID_LIMIT):
+    """
+    :param template: notification payload shared by every chunk
+    :param player_ids: iterable of player ids
+    :param chunk_size: number of player ids per request
+    :return: generator of json bodies targeting chunk_size players each
+    """
+    template = {key: value for key, value in template.items() if not key.startswith('include_')}
+    head = json.dumps(template)[:-1]
+    head = (head + ', ' if len(head) > 1 else head) + '"include_player_ids": '
+    chunk = []
+    for player_id in player_ids:
+        chunk.append(player_id)
+        if len(chunk) == chunk_size:
+            yield (head + json.dumps(chunk) + '}').encode()
+            chunk = []
+    if chunk:
+        yield (head + json.dumps(chunk) + '}').encode()
+
+
+class Checkpoint:
+    """
+    Tracks which records have been submitted so an interrupted run can resume.
+    Requests complete out of order, so the file stores the number of leading
+    records that are all done plus the few completed records beyond it, and
+    the failed records which are sent again on resume. Requests still in flight
+    when a run is killed are sent again on resume too.
+    """
+
+    def __init__(self, path: str, source: str, interval: float = 1.0):
+        """
+        :param path: checkpoint file, None disables checkpointing
+        :param source: description of the input, a resume with other input is refused
+        :param interval: minimum seconds between two writes
+        """
+        self._path = path
+        self._source = source
+        self._interval = interval
+        self._written = time.monotonic()
+        self.next = 0
+        self.done = set()
+        self.failed = set()
+
+        if path is not None and os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+            if state['source'] != source:
+                raise Exception('Checkpoint {} was written for {}'.format(path, state['source']))
+            self.next = state['next']
+            self.done = set(state['done'])
+            self.failed = set(state.get('failed', ()))
+
+    def pending(self, index: int):
+        """ :return: True when the record still has to be sent """
+        return index in self.failed or (index >= self.next and index not in self.done)
+
+    def complete(self, index: int, failed: bool = False):
+        """
+        :param index: record index
+        :param failed: True when the record failed and must be retried on resume
+        """
+        if failed:
+            self.failed.add(index)
+        else:
+            self.failed.discard(index)
+        if index >= self.next:
+            self.done.add(index)
+            while self.next in self.done:
+                self.done.remove(self.next)
+                self.next += 1
+        if time.monotonic() - self._written >= self._interval:
+            self.save()
+
+    def save(self):
+        if self._path is None:
+            return
+        temporary = self._path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'source': self._source, 'next': self.next,
+                       'done': sorted(self.done), 'failed': sorted(self.failed)}, f)
+        os.replace(temporary, self._path)
+        self._written = time.monotonic()
+
+
+class Progress:
+    """ Live throughput and error counters written to stderr """
+
+    def __init__(self, stream=sys.stderr, interval: float = 0.5):
+        self._stream = stream
+        self._interval = interval
+        self._started = time.monotonic()
+        self._printed = 0
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.recipients = 0
+        self.limit = None
+
+    def line(self):
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        line = 'sent {}  failed {}  skipped {}  recipients {}  {:.1f} req/s'.format(
+            self.sent, self.failed, self.skipped, self.recipients,
+            (self.sent + self.failed) / elapsed)
+        if self.limit is not None:
+            line += '  concurrency {}'.format(self.limit.limit)
+        return line
+
+    def update(self, force: bool = False):
+        now = time.monotonic()
+        if force or now - self._printed >= self._interval:
+            self._printed = now
+            end = '\r' if self._stream.isatty() else '\n'
+            self._stream.write(self.line() + end)
+            self._stream.flush()
+
+    def finish(self):
+        self._stream.write(self.line() + '\n')
+        self._stream.flush()
+
+
+def send(args):
+    app_id = args.app_id or os.environ.get('ONESIGNAL_APP_ID')
+    api_key = args.api_key or os.environ.get('ONESIGNAL_API_KEY')
+    if not app_id or not api_key:
+        raise SystemExit('--app-id and --api-key (or ONESIGNAL_APP_ID/ONESIGNAL_API_KEY) are required')
+
+    if args.notifications:
+        source = 'notifications:{}'.format(args.notifications)
+        records = read_notifications(args.notifications, args.format)
+    elif args.template and args.audience:
+        with open(args.template, 'r', encoding='utf-8') as f:
+            template = json.load(f)
+        source = 'audience:{}:{}'.format(args.audience, args.chunk_size)
+        records = chunk_audience(template, read_audience(args.audience, args.format, args.id_column),
+                                 args.chunk_size)
+    else:
+        raise SystemExit('either --notifications or --template with --audience is required')
+
+    checkpoint = Checkpoint(args.checkpoint, source)
+    progress = Progress()
+    failures = open(args.failures, 'ab') if args.failures else None
+
+    def pending():
+        for index, body in enumerate(records):
+            if checkpoint.pending(index):
+                yield index, body
+            else:
+                progress.skipped += 1
+
+    queue = pending()
+    if args.rate:
+        queue = RateLimiter(args.rate).limit(queue)
+    # post_many numbers what it is given, map those positions back to records
+    in_flight = {}
+
+    def bodies():
+        for position, (index, body) in enumerate(queue):
+            in_flight[position] = index, body
+            yield body
+
+    if args.concurrency == 'auto':
+        workers = progress.limit = AdaptiveLimit()
+        pool_size = workers.max_limit
+    else:
+        workers = pool_size = int(args.concurrency)
+
+    transport = Http2Transport() if args.http2 else RequestsTransport(pool_size=pool_size)
+    if args.dry_run and not args.record:
+        raise SystemExit('--dry-run requires --record')
+    if args.record:
+        transport = RecordingTransport(args.record, None if args.dry_run else transport)
+    client = OneSignal(app_id, api_key, transport=transport, url=args.url)
+    try:
+        for position, response, error in client.post_many(bodies(), workers=workers):
+            index, body = in_flight.pop(position)
+            if error is None:
+                progress.sent += 1
+                progress.recipients += response.get('recipients') or 0
+                checkpoint.complete(index)
+            else:
+                progress.failed += 1
+                # failures not written anywhere are retried by a resumed run
+                if failures is not None:
+                    failures.write(body + b'\n')
+                    failures.flush()
+                checkpoint.complete(index, failed=failures is None)
+            progress.update()
+    finally:
+        checkpoint.save()
+        progress.finish()
+        client.close()
+        if failures is not None:
+            failures.close()
+    return 1 if progress.failed else 0
+
+
+def replay(args):
+    speed = None if args.speed == 'max' else float(args.speed.rstrip('x'))
+    transport = Http2Transport() if args.http2 else None
+    stats = Replayer(args.log).replay(args.endpoint, speed=speed, api_key=args.api_key,
+                                      transport=transport, workers=args.concurrency)
+    if transport is not None:
+        transport.close()
+    sys.stderr.write('replayed {requests} requests in {elapsed:.2f}s  errors {errors}  '
+                     'max lag {max_lag:.3f}s  statuses {statuses}\n'.format(**stats))
+    return 1 if stats['errors'] else 0
+
+
+def receive(args):
+    from signalpy_webhooks import EventReceiver, FileSink, SQLiteSink
+
+    if bool(args.sqlite) == bool(args.jsonl):
+        raise SystemExit('exactly one of --sqlite or --jsonl is required')
+    sink = SQLiteSink(args.sqlite) if args.sqlite else FileSink(args.jsonl)
+    EventReceiver(sink, host=args.host, port=args.port, batch_size=args.batch_size,
+                  flush_interval=args.flush_interval).run()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='signalpy', description='OneSignal bulk sending tool')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    send_parser = commands.add_parser('send', help='send notifications from JSONL/CSV files or stdin')
+    send_parser.add_argument('--app-id', help="onesignal's app id")
+    send_parser.add_argument('--api-key', help="onesignal's rest api key")
+    send_parser.add_argument('--notifications', metavar='FILE',
+                             help="one notification per JSONL line or CSV row, '-' for stdin")
+    send_parser.add_argument('--template', metavar='FILE', help='notification payload sent to the audience')
+    send_parser.add_argument('--audience', metavar='FILE', help="player ids to target, '-' for stdin")
+    send_parser.add_argument('--id-column', default='player_id', help='player id column of the audience')
+    send_parser.add_argument('--format', choices=['jsonl', 'csv', 'text'],
+                             help='input format, guessed from the file extension by default')
+    send_parser.add_argument('--chunk-size', type=int, default=_PLAYER_ID_LIMIT,
+                             help='player ids per request')
+    send_parser.add_argument('--concurrency', default='8',
+                             help="requests in flight, 'auto' adapts it to the api's latency")
+    send_parser.add_argument('--rate', type=float, default=0, help='maximum requests per second')
+    send_parser.add_argument('--checkpoint', metavar='FILE',
+                             help='resume state file, failed records are retried on resume '
+                                  'unless --failures is given')
+    send_parser.add_argument('--failures', metavar='FILE', help='append failed payloads to this JSONL file')
+    send_parser.add_argument('--url', help='notifications endpoint, defaults to the public api')
+    send_parser.add_argument('--http2', action='store_true', help='use the HTTP/2 transport')
+    send_parser.add_argument('--record', metavar='FILE',
+                             help='append every request to this log (.gz for compression)')
+    send_parser.add_argument('--dry-run', action='store_true',
+                             help='only record requests, requires --record')
+    send_parser.set_defaults(handler=send)
+
+    replay_parser = commands.add_parser('replay', help='re-issue requests captured with --record')
+    replay_parser.add_argument('log', help='request log')
+    replay_parser.add_argument('--endpoint', help='scheme and host to send to, defaults to the recorded urls')
+    replay_parser.add_argument('--speed', default='1',
+                               help="1 for the recorded pace, N (or Nx) for N times faster, 'max' for no pacing")
+    replay_parser.add_argument('--api-key', help='rest api key added to every request')
+    replay_parser.add_argument('--concurrency', type=int, default=32, help='requests in flight')
+    replay_parser.add_argument('--http2', action='store_true', help='use the HTTP/2 transport')
+    replay_parser.set_defaults(handler=replay)
+
+    receive_parser = commands.add_parser('receive', help='collect webhook callbacks')
+    receive_parser.add_argument('--sqlite', metavar='FILE', help='store events in this SQLite database')
+    receive_parser.add_argument('--jsonl', metavar='FILE', help='append events to this JSONL file')
+    receive_parser.add_argument('--host', default='0.0.0.0', help='interface to listen on')
+    receive_parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    receive_parser.add_argument('--batch-size', type=int, default=1000, help='events per flush')
+    receive_parser.add_argument('--flush-interval', type=float, default=1.0,
+                                help='maximum seconds between flushes')
+    receive_parser.set_defaults(handler=receive)
+
+    args = parser.parse_args(argv)
+    # turn termination into SystemExit so checkpoints are saved on the way out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+Asyncio ingest server for OneSignal webhook callbacks (display, click and dismiss).
+
+Callbacks are parsed without decoding the whole json body, buffered and flushed
+in batches to a sink. Events are correlated with the notification ids returned
+by OneSignal.post through EventReceiver.track.
+
+    receiver = EventReceiver(SQLiteSink('events.db'), port=8080)
+    receiver.track(client.post(notification), campaign='spring')
+    receiver.run()
+
+GET /metrics returns ingest counters, rate and lag as json.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import asyncio
+import sqlite3
+import json
+import time
+import re
+
+# column order of the event tuples handed to sinks
+EVENT_COLUMNS = ('received_at', 'event', 'notification_id', 'player_id', 'context', 'payload')
+
+_FIELDS = re.compile(rb'"(event|id|notificationId|userId)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# string key/value pairs, other strings and brackets, to find the depth of a pair
+_TOKENS = re.compile(rb'"((?:[^"\\]|\\.)*)"\s*:\s*"((?:[^"\\]|\\.)*)"|"(?:[^"\\]|\\.)*"|[{}\[\]]')
+_WANTED = frozenset((b'event', b'id', b'notificationId', b'userId'))
+_CONTENT_LENGTH = re.compile(rb'\r\ncontent-length:\s*(\d+)', re.IGNORECASE)
+_CLOSE = re.compile(rb'\r\nconnection:\s*close', re.IGNORECASE)
+_CHUNKED = re.compile(rb'\r\ntransfer-encoding:[^\r]*chunked', re.IGNORECASE)
+
+# event name used when the payload does not carry one, by url path
+_PATH_EVENTS = (('display', 'notification.displayed'),
+                ('click', 'notification.clicked'),
+                ('dismiss', 'notification.dismissed'))
+
+_OK = b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n'
+_BUSY = b'HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\n\r\n'
+_NOT_FOUND = b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n'
+_BAD_REQUEST = b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+
+
+def _fields(body: bytes):
+    """
+    :return: top level event, id, notificationId and userId values of a callback body,
+    nested objects such as additionalData may hold the same keys
+    """
+    if body.count(b'{') == 1 and b'[' not in body:
+        fields = {}
+        for key, value in _FIELDS.findall(body):
+            fields.setdefault(key, value)
+        return fields
+
+    fields, depth = {}, 0
+    for match in _TOKENS.finditer(body):
+        key = match.group(1)
+        if key is not None:
+            if depth == 1 and key in _WANTED and key not in fields:
+                fields[key] = match.group(2)
+            continue
+        token = match.group()
+        if token in (b'{', b'['):
+            depth += 1
+        elif token in (b'}', b']'):
+            depth -= 1
+    return fields
+
+
+async def _read_chunked(reader: asyncio.StreamReader):
+    """ :return: body of a chunked transfer encoded request """
+    chunks = []
+    while True:
+        size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+        if size == 0:
+            # skip the optional trailers up to the final empty line
+            while await reader.readuntil(b'\r\n') != b'\r\n':
+                pass
+            return b''.join(chunks)
+        chunks.append((await reader.readexactly(size + 2))[:-2])
+
+
+def _text(value: bytes):
+    """ :return: decoded json string contents, unescaping only when needed """
+    if value is None:
+        return None
+    if b'\\' in value:
+        return json.loads(b'"' + value + b'"')
+    return value.decode()
+
+
+class Sink:
+    """ Destination of flushed event batches, called from a single worker thread """
+
+    def write(self, events: list):
+        """
+        :param events: list of tuples ordered as EVENT_COLUMNS
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """ release resources """
+
+
+class CallableSink(Sink):
+    """ Hand every batch to a callable """
+
+    def __init__(self, callback):
+        """
+        :param callback: function taking a list of event tuples
+        """
+        self._callback = callback
+
+    def write(self, events: list):
+        self._callback(events)
+
+
+class FileSink(Sink):
+    """ Append events to a JSON lines file """
+
+    def __init__(self, path: str):
+        """
+        :param path: output file
+        """
+        self._file = open(path, 'ab')
+
+    def write(self, events: list):
+        lines = []
+        for received_at, event, notification_id, player_id, context, payload in events:
+            head = json.dumps({'received_at': received_at, 'event': event,
+                               'notification_id': notification_id, 'player_id': player_id,
+                               'context': context})
+            # the raw callback body is already json, splice it in as is
+            lines.append(head[:-1].encode() + b', "payload": ' + (payload or b'null') + b'}\n')
+        self._file.write(b''.join(lines))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SQLiteSink(Sink):
+    """ Insert events into a SQLite table, one transaction per batch """
+
+    def __init__(self, path: str, table: str = 'events'):
+        """
+        :param path: database file
+        :param table: table name, created when missing
+        """
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS {} (received_at REAL, event TEXT, notification_id TEXT, '
+            'player_id TEXT, context TEXT, payload BLOB)'.format(table))
+        self._insert = 'INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?)'.format(table)
+
+    def write(self, events: list):
+        with self._connection:
+            self._connection.executemany(self._insert, events)
+
+    def close(self):
+        self._connection.close()
+
+
+class EventReceiver:
+    """ Buffering webhook receiver """
+
+    def __init__(self, sink, host: str = '0.0.0.0', port: int = 8080,
+                 batch_size: int = 1000, flush_interval: float = 1.0,
+                 max_buffer: int = 100000, max_tracked: int = 1000000):
+        """
+        :param sink: Sink instance or a callable taking a list of event tuples
+        :param host: interface to listen on
+        :param port: port to listen on, 0 picks a free one
+        :param batch_size: number of buffered events triggering a flush
+        :param flush_interval: maximum seconds an event waits in the buffer
+        :param max_buffer: buffered events above which callbacks are answered
+        with 503 so OneSignal retries them later
+        :param max_tracked: number of tracked notification ids kept for correlation
+        """
+        self._sink = sink if isinstance(sink, Sink) else CallableSink(sink)
+        self._host = host
+        self._port = port
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_buffer = max_buffer
+        self._max_tracked = max_tracked
+        self._tracked = OrderedDict()
+        self._buffer = []
+        self._server = None
+        self._connections = set()
+        self._ticker = None
+        self._flushing = None
+        self._writer = ThreadPoolExecutor(max_workers=1)
+
+        self._started = time.monotonic()
+        self._received = 0
+        self._flushed = 0
+        self._rejected = 0
+        self._unmatched = 0
+        self._failed_flushes = 0
+        self._rate = 0.0
+        self._rate_sample = (self._started, 0)
+        self._flush_lag = 0.0
+        self._flush_duration = 0.0
+
+    def track(self, response: dict, **context):
+        """
+        remember a notification id returned by OneSignal.post so its events
+        are stored with the given context
+        :param response: json returned by OneSignal.post
+        :param context: optional values stored with every event, such as a campaign name
+        """
+        notification_id = response.get('id')
+        if notification_id:
+            self._tracked[notification_id] = json.dumps(context) if context else ''
+            if len(self._tracked) > self._max_tracked:
+                self._tracked.popitem(last=False)
+
+    @property
+    def port(self):
+        """ :return: port the server listens on """
+        return self._server.sockets[0].getsockname()[1]
+
+    def metrics(self):
+        """ :return: ingest counters, rate and lag """
+        now = time.monotonic()
+        oldest = time.time() - self._buffer[0][0] if self._buffer else 0.0
+        return {'received': self._received, 'flushed': self._flushed,
+                'buffered': len(self._buffer), 'rejected': self._rejected,
+                'unmatched': self._unmatched, 'failed_flushes': self._failed_flushes,
+                'ingest_rate': round(self._rate, 1),
+                'buffer_lag': round(max(oldest, 0.0), 3),
+                'flush_lag': round(self._flush_lag, 3),
+                'flush_duration': round(self._flush_duration, 3),
+                'uptime': round(now - self._started, 1)}
+
+    def _ingest(self, path: bytes, body: bytes):
+        """ buffer one callback, returns False when the buffer is full """
+        if len(self._buffer) >= self._max_buffer:
+            self._rejected += 1
+            return False
+
+        fields = _fields(body)
+        event = _text(fields.get(b'event'))
+        if event is None:
+            lowered = path.lower()
+            event = next((name for part, name in _PATH_EVENTS if part.encode() in lowered),
+                         path.decode())
+
+        # OneSignal sends the notification id as "id", older integrations as "notificationId"
+        notification_id = _text(fields.get(b'id') or fields.get(b'notificationId')) or ''
+        player_id = _text(fields.get(b'userId')) or None
+        context = self._tracked.get(notification_id)
+        if context is None:
+            self._unmatched += 1
+
+        self._buffer.append((time.time(), event, notification_id or None,
+                             player_id, context or None, body))
+        self._received += 1
+        if len(self._buffer) >= self._batch_size:
+            self._schedule_flush()
+        return True
+
+    def _schedule_flush(self):
+        if self._buffer and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self._buffer:
+            batch, self._buffer = self._buffer, []
+            started = time.time()
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._writer, self._sink.write, batch)
+            except Exception:
+                self._failed_flushes += 1
+                # keep the events, they are retried on the next flush
+                self._buffer = batch + self._buffer
+                return
+            self._flushed += len(batch)
+            self._flush_duration = time.time() - started
+            self._flush_lag = time.time() - batch[0][0]
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            now = time.monotonic()
+            sampled_at, sampled = self._rate_sample
+            self._rate = (self._received - sampled) / max(now - sampled_at, 1e-9)
+            self._rate_sample = (now, self._received)
+            self._schedule_flush()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+
+                line_end = head.find(b'\r\n')
+                parts = head[:line_end].split(b' ')
+                if len(parts) != 3:
+                    writer.write(_BAD_REQUEST)
+                    return
+                method, path, _ = parts
+
+                if _CHUNKED.search(head):
+                    try:
+                        body = await _read_chunked(reader)
+                    except (ValueError, asyncio.LimitOverrunError):
+                        writer.write(_BAD_REQUEST)
+                        return
+                else:
+                    length = _CONTENT_LENGTH.search(head)
+                    body = await reader.readexactly(int(length.group(1))) if length else b''
+
+                if method == b'POST':
+                    writer.write(_OK if self._ingest(path, body) else _BUSY)
+                elif method == b'GET' and path.startswith(b'/metrics'):
+                    content = json.dumps(self.metrics()).encode()
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                                 b'Content-Length: ' + str(len(content)).encode() + b'\r\n\r\n' + content)
+                else:
+                    writer.write(_NOT_FOUND)
+
+                if _CLOSE.search(head):
+                    return
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def start(self):
+        """ start listening and flushing """
+        self._server = await asyncio.start_server(self._handle, self._host, self._port)
+        self._ticker = asyncio.ensure_future(self._tick())
+        return self
+
+    async def stop(self):
+        """ stop listening, flush the remaining events and close the sink """
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        self._ticker.cancel()
+        if self._flushing is not None:
+            await self._flushing
+        await self._flush()
+        self._writer.shutdown()
+        self._sink.close()
+
+    def run(self):
+        """ serve until interrupted """
+        async def serve():
+            await self.start()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await self.stop()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
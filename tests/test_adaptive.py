@@ -0,0 +1,38 @@
+import time
+
+from SignalPy import AdaptiveLimit
+
+
+def test_burst_of_throttled_responses_cuts_once():
+    limit = AdaptiveLimit(initial=64, backoff=0.5)
+    for _ in range(64):
+        limit.record(0.2, dropped=True)
+    assert limit.limit == 32
+    assert limit.metrics()['dropped'] == 64
+
+
+def test_requests_started_after_a_cut_cut_again():
+    limit = AdaptiveLimit(initial=64, backoff=0.5)
+    limit.record(0.2, dropped=True)
+    time.sleep(0.02)
+    limit.record(0.01, dropped=True)
+    assert limit.limit == 16
+
+
+def test_limit_grows_while_latency_is_flat_and_stays_in_bounds():
+    limit = AdaptiveLimit(initial=4, max_limit=32)
+    for _ in range(5000):
+        limit.record(0.05)
+    assert limit.limit == 32
+
+    limit = AdaptiveLimit(initial=4, min_limit=2, backoff=0.1)
+    limit.record(0.0, dropped=True)
+    assert limit.limit == 2
+
+
+def test_zero_latency_samples_are_accepted():
+    limit = AdaptiveLimit(initial=8)
+    for _ in range(100):
+        limit.record(0.0)
+    assert limit.limit >= 8
+    assert limit.metrics()['baseline_latency'] > 0
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from SignalPy import BulkNotification, Notification
+
+
+def bodies(builder, **kwargs):
+    return [(json.loads(body), ids) for body, ids in builder.payloads(**kwargs)]
+
+
+def test_rows_match_the_per_row_builder():
+    data = {'id': ['a', 'b', 'c'], 'lang': ['en', 'de', 'fr'],
+            'title': ['Hi', 'Hallo', 'Salut'], 'body': ['One', 'Zwei', 'Trois "3"']}
+    builder = BulkNotification(data, {'contents': 'body', 'headings': 'title'},
+                               player_ids='id', language='lang')
+
+    expected = []
+    for player_id, lang, title, body in zip(data['id'], data['lang'], data['title'], data['body']):
+        notification = Notification().add_content(lang, body).add_heading(lang, title)
+        notification.data['include_player_ids'] = [player_id]
+        expected.append((json.loads(notification.to_json()), [player_id]))
+    assert bodies(builder) == expected
+
+
+def test_identical_rows_are_grouped_and_chunked():
+    data = {'id': ['p{}'.format(i) for i in range(5)], 'body': ['same'] * 4 + ['other']}
+    result = bodies(BulkNotification(data, {'contents': 'body'}, player_ids='id'), chunk_size=3)
+
+    assert [ids for _, ids in result] == [['p0', 'p1', 'p2'], ['p3'], ['p4']]
+    assert result[0][0] == {'contents': {'en': 'same'}, 'include_player_ids': ['p0', 'p1', 'p2']}
+    assert result[2][0]['contents'] == {'en': 'other'}
+
+
+def test_chunk_size_above_the_api_limit_is_rejected():
+    builder = BulkNotification({'id': ['a'], 'body': ['x']}, {'contents': 'body'}, player_ids='id')
+    with pytest.raises(Exception):
+        list(builder.payloads(chunk_size=2001))
+
+
+def test_missing_cells_keep_the_base_values():
+    base = (Notification().add_contents({'en': 'Default', 'de': 'Standard'})
+            .add_url('https://example.com').add_segments(['Active Users']))
+    data = {'id': ['a', 'b', 'c', 'd'], 'lang': ['de', 'fr', None, 'en'],
+            'body': ['Hallo', 'Salut', float('nan'), None],
+            'url': ['https://a', None, 'https://c', 'https://d']}
+    builder = BulkNotification(data, {'contents': 'body', 'url': 'url'},
+                               player_ids='id', language='lang', base=base)
+    result = {ids[0]: body for body, ids in bodies(builder)}
+
+    assert result['a']['contents'] == {'en': 'Default', 'de': 'Hallo'}
+    assert result['b']['contents'] == {'en': 'Default', 'de': 'Standard', 'fr': 'Salut'}
+    assert result['b']['url'] == 'https://example.com'
+    assert result['c']['contents'] == {'en': 'Default', 'de': 'Standard'}
+    assert result['d']['contents'] == {'en': 'Default', 'de': 'Standard'}
+    assert all(body['included_segments'] == ['Active Users'] for body in result.values())
+
+
+def test_percent_signs_are_kept_literally():
+    base = Notification().add_headings({'en': '100% off'})
+    data = {'id': ['a', 'b'], 'body': ['%s and %d', '50%']}
+    builder = BulkNotification(data, {'contents': 'body'}, player_ids='id', base=base)
+
+    assert [body['contents']['en'] for body, _ in bodies(builder)] == ['%s and %d', '50%']
+    assert all(body['headings'] == {'en': '100% off'} for body, _ in bodies(builder))
+
+
+def test_numpy_columns():
+    np = pytest.importorskip('numpy')
+    data = {'id': np.array(['a', 'b', 'c']), 'body': np.array(['x', 'y', 'x']),
+            'url': np.array(['https://x', None, 'https://x'], dtype=object)}
+    builder = BulkNotification(data, {'contents': 'body', 'url': 'url'}, player_ids='id')
+
+    assert [ids for _, ids in bodies(builder)] == [['a', 'c'], ['b']]
+    assert 'url' not in bodies(builder)[1][0]
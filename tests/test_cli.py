@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'signalpy_cli.py')
+
+
+@pytest.fixture
+def api():
+    received = []
+    state = {'fail': True}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            received.append(body['contents']['en'])
+            failing = state['fail'] and body['contents']['en'].startswith('fail')
+            content = b'{"errors": ["bad"]}' if failing else b'{"id": "n", "recipients": 1}'
+            self.send_response(400 if failing else 200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}/api/v1/notifications'.format(server.server_address[1]), received, state
+    server.shutdown()
+
+
+def send(tmp_path, url, *extra):
+    return subprocess.run([sys.executable, CLI, 'send', '--app-id', 'app', '--api-key', 'key',
+                           '--notifications', 'campaign.jsonl', '--checkpoint', 'campaign.ckpt',
+                           '--url', url, '--concurrency', '2'] + list(extra),
+                          cwd=str(tmp_path), capture_output=True, text=True)
+
+
+def write_campaign(tmp_path):
+    texts = ['ok 1', 'fail 2', 'ok 3', 'fail 4', 'ok 5']
+    with open(str(tmp_path / 'campaign.jsonl'), 'w') as f:
+        for text in texts:
+            f.write(json.dumps({'contents': {'en': text}, 'included_segments': ['All']}) + '\n')
+
+
+def test_failed_records_are_retried_on_resume_from_any_directory(tmp_path, api):
+    url, received, state = api
+    write_campaign(tmp_path)
+
+    first = send(tmp_path, url)
+    assert first.returncode == 1, first.stderr
+    assert sorted(received) == ['fail 2', 'fail 4', 'ok 1', 'ok 3', 'ok 5']
+
+    received.clear()
+    state['fail'] = False
+    second = send(tmp_path, url)
+    assert second.returncode == 0, second.stderr
+    assert sorted(received) == ['fail 2', 'fail 4']
+
+    received.clear()
+    assert send(tmp_path, url).returncode == 0
+    assert received == []
+
+
+def test_failures_written_to_file_are_not_resent(tmp_path, api):
+    url, received, _ = api
+    write_campaign(tmp_path)
+
+    send(tmp_path, url, '--failures', 'failed.jsonl')
+    with open(str(tmp_path / 'failed.jsonl')) as f:
+        assert sorted(json.loads(line)['contents']['en'] for line in f) == ['fail 2', 'fail 4']
+
+    received.clear()
+    assert send(tmp_path, url, '--failures', 'failed.jsonl').returncode == 0
+    assert received == []
+
+
+def test_checkpoint_advances_past_failed_records(tmp_path):
+    from signalpy_cli import Checkpoint
+
+    path = str(tmp_path / 'campaign.ckpt')
+    checkpoint = Checkpoint(path, 'source')
+    checkpoint.complete(0, failed=True)
+    for index in range(1, 10000):
+        checkpoint.complete(index)
+    checkpoint.complete(10001)
+    checkpoint.save()
+    assert (checkpoint.next, checkpoint.done, checkpoint.failed) == (10000, {10001}, {0})
+
+    resumed = Checkpoint(path, 'source')
+    assert [index for index in range(10003) if resumed.pending(index)] == [0, 10000, 10002]
+    resumed.complete(0)
+    assert not resumed.pending(0)
+    assert resumed.next == 10000
@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+import SignalPy
+from SignalPy import Experiment, LangCodes, Notification
+
+
+def experiment(*weights, name='spring'):
+    experiment = Experiment(name, Notification().add_content(LangCodes.English, 'Base'))
+    for index, weight in enumerate(weights):
+        experiment.add_variant('v{}'.format(index), weight,
+                               contents={LangCodes.English: 'Variant {}'.format(index)})
+    return experiment
+
+
+def shares(experiment, player_ids):
+    counts = dict.fromkeys(experiment.variants, 0)
+    for _, name in experiment.assignments(player_ids):
+        counts[name] += 1
+    return counts
+
+
+@pytest.mark.parametrize('weights', [(1, 1), (1, 2, 1), (9, 1)])
+@pytest.mark.parametrize('ids', [lambda i: 'player-{}'.format(i),
+                                 lambda i: '{:08x}-0000-4000-8000-000000000000'.format(i)])
+def test_split_follows_weights_for_structured_ids(weights, ids):
+    count = 100000
+    counts = shares(experiment(*weights), [ids(i) for i in range(count)])
+    total = sum(weights)
+    for index, weight in enumerate(weights):
+        p = weight / total
+        sigma = math.sqrt(count * p * (1 - p))
+        assert abs(counts['v{}'.format(index)] - count * p) < 5 * sigma
+
+
+def test_small_audiences_split_evenly():
+    counts = shares(experiment(1, 2, 1), ['player-{}'.format(i) for i in range(5000)])
+    assert abs(counts['v2'] - 1250) < 5 * math.sqrt(5000 * 0.25 * 0.75)
+
+
+def test_assignment_is_stable_and_salted_by_name():
+    player_ids = ['player-{}'.format(i) for i in range(1000)]
+    first, second = experiment(1, 1), experiment(1, 1)
+    assert [first.assign(p) for p in player_ids] == [second.assign(p) for p in player_ids]
+
+    other = experiment(1, 1, name='autumn')
+    differing = sum(first.assign(p) != other.assign(p) for p in player_ids)
+    assert 350 < differing < 650
+
+
+def test_numpy_and_pure_python_assignments_match(monkeypatch):
+    pytest.importorskip('numpy')
+    player_ids = ['player-{}'.format(i) for i in range(3000)] + ['ünïcødé', '']
+    split = experiment(1, 2, 1)
+    vectorised = list(split.assignments(player_ids, block_size=1000))
+    assert vectorised == [(p, split.assign(p)) for p in player_ids]
+
+    monkeypatch.setattr(SignalPy, 'np', None)
+    assert list(split.assignments(player_ids, block_size=1000)) == vectorised
+
+
+def test_fan_out_targets_every_player_once_in_chunks():
+    player_ids = ['player-{}'.format(i) for i in range(5000)]
+    split = experiment(1, 1)
+    seen = []
+    for name, notification in split.fan_out(player_ids, chunk_size=1000, block_size=1500):
+        targeted = notification.data['include_player_ids']
+        assert len(targeted) <= 1000
+        assert all(split.assign(p) == name for p in targeted)
+        assert notification.contents == {'en': 'Variant {}'.format(name[1:])}
+        seen.extend(targeted)
+    assert sorted(seen) == sorted(player_ids)
@@ -0,0 +1,103 @@
+import json
+import pickle
+import threading
+
+import pytest
+
+from SignalPy import LangCodes, LocalizedText, Notification
+
+
+def test_equal_texts_are_interned():
+    first = LocalizedText({'en': 'Hello', 'de': 'Hallo'})
+    assert LocalizedText({'en': 'Hello', 'de': 'Hallo'}) is first
+    assert LocalizedText(first) is first
+    assert LocalizedText({'en': 'Hello'}) is not first
+
+
+def test_merge_returns_new_instance_and_keeps_order():
+    text = LocalizedText({'en': 'Hello', 'de': 'Hallo'})
+    merged = text.merge({'de': 'Guten Tag', 'fr': 'Bonjour'})
+
+    assert text == {'en': 'Hello', 'de': 'Hallo'}
+    assert list(merged.items()) == [('en', 'Hello'), ('de', 'Guten Tag'), ('fr', 'Bonjour')]
+    assert json.loads(merged.json) == merged
+    assert merged is LocalizedText({'en': 'Hello', 'de': 'Guten Tag', 'fr': 'Bonjour'})
+    assert text.merge({'en': 'Hello'}) is text
+
+
+def test_merge_back_to_previous_texts_finds_the_interned_instance():
+    text = LocalizedText({'en': 'Hello', 'de': 'Hallo'})
+    assert text.merge({'de': 'Servus'}).merge({'de': 'Hallo'}) is text
+
+
+def test_is_immutable():
+    text = LocalizedText({'en': 'Hello'})
+    for mutate in (lambda: text.__setitem__('de', 'Hallo'), lambda: text.update(de='Hallo'),
+                   lambda: text.pop('en'), lambda: text.clear(), lambda: text.__delitem__('en')):
+        with pytest.raises(TypeError):
+            mutate()
+    assert text == {'en': 'Hello'}
+
+
+def test_json_is_cached_and_escaped():
+    text = LocalizedText({'en': 'Say "hi"', 'ja': 'こんにちは'})
+    assert text.json is text.json
+    assert json.loads(text.json) == {'en': 'Say "hi"', 'ja': 'こんにちは'}
+    assert pickle.loads(pickle.dumps(text)) is text
+
+
+def test_concurrent_merges_share_instances():
+    base = LocalizedText({'lang-{}'.format(i): 'text {}'.format(i) for i in range(40)})
+    results = []
+
+    def worker():
+        for i in range(200):
+            merged = base.merge({'lang-{}'.format(i % 40): 'changed', 'extra': str(i % 5)})
+            results.append(merged)
+            assert json.loads(merged.json) == merged
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    instances = {}
+    for result in results:
+        assert instances.setdefault(frozenset(result.items()), result) is result
+
+
+def test_add_content_keeps_previous_languages():
+    notification = (Notification().add_content(LangCodes.English, 'Hello')
+                    .add_content(LangCodes.German, 'Hallo')
+                    .add_heading(LangCodes.English, 'Title')
+                    .add_subtitle(LangCodes.English, 'Subtitle'))
+    assert notification.contents == {'en': 'Hello', 'de': 'Hallo'}
+    assert notification.headings == {'en': 'Title'}
+    assert notification.subtitles == {'en': 'Subtitle'}
+
+
+def test_add_contents_merges_dicts_and_shared_texts():
+    shared = LocalizedText({'en': 'Hello', 'es': 'Hola'})
+    notification = Notification().add_contents(shared)
+    assert notification.contents is shared
+
+    notification.add_contents({'de': 'Hallo'}).add_headings({'en': 'A'}).add_headings({'es': 'B'})
+    assert notification.contents == {'en': 'Hello', 'es': 'Hola', 'de': 'Hallo'}
+    assert notification.headings == {'en': 'A', 'es': 'B'}
+    assert shared == {'en': 'Hello', 'es': 'Hola'}
+
+    notification.subtitles = {'en': 'Sub'}
+    assert notification.subtitles == {'en': 'Sub'}
+
+
+def test_data_stays_json_serializable():
+    notification = Notification().add_contents({'en': 'Hello'}).add_headings({'en': 'Title'})
+    notification.data['include_player_ids'] = ['a']
+    assert json.loads(json.dumps(notification.data)) == json.loads(notification.to_json())
+
+
+def test_copy_shares_texts_but_not_fields():
+    notification = Notification().add_content(LangCodes.English, 'Hello')
+    copy = notification.copy().add_content(LangCodes.German, 'Hallo')
+    assert notification.contents == {'en': 'Hello'}
+    assert copy.contents == {'en': 'Hello', 'de': 'Hallo'}
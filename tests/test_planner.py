@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone, time as day_time
+
+import pytest
+
+from SignalPy import LocalDeliveryPlanner, Notification, LangCodes
+
+pytest.importorskip('zoneinfo')
+
+
+def planner(start, at=day_time(9, 0), **kwargs):
+    base = Notification().add_content(LangCodes.English, 'Good morning')
+    return LocalDeliveryPlanner(base, at, start=start, **kwargs)
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_offset_is_taken_at_delivery_not_at_start():
+    # Berlin leaves summer time between start and delivery
+    start = utc(2026, 10, 24, 12, 0)
+    assert planner(start).delivery_time('Europe/Berlin') == utc(2026, 10, 25, 8, 0)
+    # New York enters summer time between start and delivery
+    start = utc(2027, 3, 13, 18, 0)
+    assert planner(start).delivery_time('America/New_York') == utc(2027, 3, 14, 13, 0)
+
+
+def test_delivery_later_today_or_tomorrow():
+    start = utc(2026, 7, 1, 6, 0)
+    assert planner(start).delivery_time('Europe/Berlin') == utc(2026, 7, 1, 7, 0)
+    assert planner(start).delivery_time('Asia/Tokyo') == utc(2026, 7, 2, 0, 0)
+
+
+@pytest.mark.parametrize('tz', [19800, '19800', '+05:30', 'UTC+0530', timedelta(hours=5, minutes=30),
+                                'Asia/Kolkata'])
+def test_timezone_formats(tz):
+    start = utc(2026, 7, 1, 0, 0)
+    assert planner(start).delivery_time(tz) == utc(2026, 7, 1, 3, 30)
+
+
+def test_negative_numeric_strings_are_seconds():
+    start = utc(2026, 1, 10, 0, 0)
+    assert planner(start).delivery_time('-18000') == utc(2026, 1, 10, 14, 0)
+
+
+def test_plan_groups_by_delivery_instant():
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    audience = [('a', 'Europe/Paris'), ('b', 'Europe/Berlin'), ('c', 'Asia/Kolkata'),
+                ('d', '19800'), ('e', 19800), ('f', 'America/New_York')]
+    plan = list(planner(start, chunk_size=2).plan(audience))
+
+    groups = {}
+    for send_after, notification in plan:
+        assert len(notification.data['include_player_ids']) <= 2
+        assert notification.data['send_after'] == send_after.strftime('%Y-%m-%d %H:%M:%S GMT-0000')
+        groups.setdefault(send_after, []).extend(notification.data['include_player_ids'])
+    assert sorted(map(sorted, groups.values())) == [['a', 'b'], ['c', 'd', 'e'], ['f']]
+
+
+def test_schedule_spreads_submissions_before_delivery():
+    start = datetime.now(timezone.utc) + timedelta(days=1)
+    audience = [('p{}'.format(i), 'Europe/Berlin') for i in range(10)]
+    schedule = planner(start, chunk_size=2).schedule(audience, now=start)
+
+    assert len(schedule) == 5
+    send_after = schedule[0][1]
+    assert all(submit_at <= send_after - timedelta(minutes=10) for submit_at, _, _ in schedule)
+    assert [submit_at for submit_at, _, _ in schedule] == sorted(submit_at for submit_at, _, _ in schedule)
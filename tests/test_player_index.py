@@ -0,0 +1,97 @@
+import gzip
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from SignalPy import Filter, PlayerIndex, Relation
+
+NOW = 1800000000.0
+
+
+def index():
+    return PlayerIndex({
+        'id': ['a', 'b', 'c', 'd'],
+        'session_count': [5, 50, float('nan'), 12],
+        'amount_spent': [0, 25.5, 3, 0],
+        'last_active': [NOW - 3600, NOW - 100 * 3600, NOW - 10 * 3600, NOW - 30 * 3600],
+        'lat': [48.8566, 52.52, 40.7128, float('nan')],
+        'long': [2.3522, 13.405, -74.006, float('nan')],
+        'language': ['en', 'de', 'en', None],
+        'country': ['FR', 'DE', 'US', 'US'],
+        'game_version': ['1.2.0', '1.10.0', '2.0', '1.9.9'],
+        'tags': [{'tier': 'gold', 'level': '12'}, '{"tier": "silver"}', None, {'level': '3'}],
+    })
+
+
+def test_and_binds_tighter_than_or():
+    players = index()
+    # (en AND session_count > 10) OR country = DE
+    filters = (Filter().language(Relation.Equal, 'en').session_count(Relation.GreaterThan, 10)
+               .or_.country('DE'))
+    assert players.match(filters).tolist() == ['b']
+
+    # explicit AND entries join like adjacent ones
+    filters = Filter().language(Relation.Equal, 'en').and_.session_count(Relation.LowerThan, 10)
+    assert players.match(filters).tolist() == ['a']
+
+    filters = (Filter().country('US').or_.amount_spent(Relation.GreaterThan, 20)
+               .or_.tag('tier', Relation.Equal, 'gold'))
+    assert players.match(filters).tolist() == ['a', 'b', 'c', 'd']
+
+
+def test_location_uses_great_circle_distance():
+    players = index()
+    # Paris to Berlin is about 878 km
+    assert players.match(Filter().location(900000, 48.8566, 2.3522)).tolist() == ['a', 'b']
+    assert players.match(Filter().location(850000, 48.8566, 2.3522)).tolist() == ['a']
+    # players without coordinates never match
+    assert players.count(Filter().location(2.1e7, 0, 0)) == 3
+
+
+def test_session_and_version_fields():
+    players = index()
+    assert players.match(Filter().last_session(Relation.LowerThan, 24), now=NOW).tolist() == ['a', 'c']
+    assert players.match(Filter().app_version(Relation.GreaterThan, '1.9.10')).tolist() == ['b', 'c']
+    assert players.match(Filter().language(Relation.NotEqual, 'en')).tolist() == ['b']
+
+
+def test_tags():
+    players = index()
+    assert players.match(Filter().tag('tier', Relation.Exists)).tolist() == ['a', 'b']
+    assert players.match(Filter().tag('tier', Relation.NotExists)).tolist() == ['c', 'd']
+    assert players.match(Filter().tag('level', Relation.GreaterThan, '5')).tolist() == ['a']
+
+
+def test_unsupported_fields_raise():
+    with pytest.raises(Exception):
+        index().count(Filter().bought_sku('sku', Relation.GreaterThan, 1))
+
+
+def test_save_load_round_trip(tmp_path):
+    players = index()
+    path = str(tmp_path / 'players.npz')
+    players.save(path)
+    loaded = PlayerIndex.load(path)
+
+    assert len(loaded) == 4
+    for filters in (Filter().tag('tier', Relation.Exists), Filter().tag('level', Relation.LowerThan, '5'),
+                    Filter().country('US').language(Relation.Equal, 'en'),
+                    Filter().location(900000, 48.8566, 2.3522)):
+        assert loaded.match(filters).tolist() == players.match(filters).tolist()
+
+
+def test_from_export_and_target_devices(tmp_path):
+    path = str(tmp_path / 'players.csv.gz')
+    with gzip.open(path, 'wt') as f:
+        f.write('id,session_count,language,tags,last_active,created_at,country\n'
+                'a,5,en,"{""tier"": ""gold""}",2026-10-17 12:00:00,2025-01-01 00:00:00,US\n'
+                'b,50,de,,1760000000,,DE\n'
+                'c,7,en,,,,US\n')
+    players = PlayerIndex.from_export(path)
+
+    assert players.match(Filter().tag('tier', Relation.Exists)).tolist() == ['a']
+    batches = [device.data for device in players.target_devices(Filter().country('US'), chunk_size=1)]
+    assert batches == [{'include_player_ids': ['a']}, {'include_player_ids': ['c']}]
+    now = 1792324800.0  # 2026-10-18 12:00 UTC
+    assert players.match(Filter().last_session(Relation.LowerThan, 25), now=now).tolist() == ['a']
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from SignalPy import LangCodes, Notification, OneSignal, RecordingTransport, Replayer, RequestsTransport
+
+
+@pytest.fixture
+def server():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            received.append((self.path, dict(self.headers), json.loads(body), time.monotonic()))
+            content = b'{"id": "n", "recipients": 3}'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_address[1]), received
+    httpd.shutdown()
+
+
+def notification(text: str):
+    return Notification().add_content(LangCodes.English, text).add_segments(['All'])
+
+
+def read_log(path: str):
+    return list(Replayer(path).records())
+
+
+@pytest.mark.parametrize('name', ['traffic.log', 'traffic.log.gz'])
+def test_recording_forwards_and_strips_authorization(tmp_path, server, name):
+    endpoint, received = server
+    path = str(tmp_path / name)
+    client = OneSignal('app', 'secret-key', url=endpoint + '/api/v1/notifications',
+                       transport=RecordingTransport(path, RequestsTransport()))
+    assert client.post(notification('hello'))['recipients'] == 3
+    client.close()
+
+    assert received[0][1]['Authorization'] == 'Basic secret-key'
+    records = read_log(path)
+    assert len(records) == 1
+    assert records[0]['s'] == 200 and records[0]['m'] == 'POST'
+    assert json.loads(records[0]['b'])['contents'] == {'en': 'hello'}
+    assert all(key.lower() != 'authorization' for key in records[0]['h'])
+    assert 'secret-key' not in open(path, 'rb').read().decode('latin-1')
+
+
+def test_dry_run_answers_locally(tmp_path, server):
+    endpoint, received = server
+    path = str(tmp_path / 'dry.log')
+    client = OneSignal('app', 'key', url=endpoint + '/api/v1/notifications',
+                       transport=RecordingTransport(path))
+    assert client.post(notification('dry'))['recipients'] == 0
+    client.close()
+
+    assert received == []
+    assert [record['u'] for record in read_log(path)] == [endpoint + '/api/v1/notifications']
+
+
+def test_replay_rewrites_the_host_and_sets_the_api_key(tmp_path, server):
+    endpoint, received = server
+    path = str(tmp_path / 'capture.log')
+    client = OneSignal('app', 'key', transport=RecordingTransport(path))
+    for text in ('one', 'two'):
+        client.post(notification(text))
+    client.close()
+
+    stats = Replayer(path).replay(endpoint, speed=None, api_key='replay-key')
+    assert stats['requests'] == 2 and stats['errors'] == 0 and stats['statuses'] == {200: 2}
+    assert sorted(body['contents']['en'] for _, _, body, _ in received) == ['one', 'two']
+    assert all(path == '/api/v1/notifications' for path, _, _, _ in received)
+    assert all(headers['Authorization'] == 'Basic replay-key' for _, headers, _, _ in received)
+
+
+def test_replay_target_keeps_path_and_query():
+    assert (Replayer._target('https://onesignal.com/api/v1/notifications/n?app_id=a', 'http://localhost:8080')
+            == 'http://localhost:8080/api/v1/notifications/n?app_id=a')
+    assert Replayer._target('https://onesignal.com/x', None) == 'https://onesignal.com/x'
+
+
+def write_paced_log(path: str, gaps: list):
+    start = time.time()
+    with open(path, 'w') as f:
+        for offset in gaps:
+            f.write(json.dumps({'t': start + offset, 'm': 'POST', 'u': 'https://onesignal.com/api/v1/notifications',
+                                'h': {'Content-Type': 'application/json'}, 'b': '{"n": 1}',
+                                'd': 0.01, 's': 200}) + '\n')
+
+
+@pytest.mark.parametrize('speed, low, high', [(1.0, 0.55, 1.5), (3.0, 0.15, 0.5), (None, 0.0, 0.2)])
+def test_replay_paces_requests(tmp_path, server, speed, low, high):
+    endpoint, received = server
+    path = str(tmp_path / 'paced.log')
+    write_paced_log(path, [0.0, 0.3, 0.6])
+
+    stats = Replayer(path).replay(endpoint, speed=speed)
+    arrivals = sorted(arrived for _, _, _, arrived in received)
+    assert stats['requests'] == 3
+    assert low <= arrivals[-1] - arrivals[0] <= high
+
+
+@pytest.mark.parametrize('cut, replayed', [(0, 3), (12, 2)])
+def test_unclosed_gzip_log_replays_what_was_written(tmp_path, server, cut, replayed):
+    endpoint, received = server
+    path = str(tmp_path / 'killed.log.gz')
+    client = OneSignal('app', 'key', transport=RecordingTransport(path))
+    for text in ('one', 'two', 'three'):
+        client.post(notification(text))
+    # a copy taken while the log is still open has no gzip trailer, like a killed run,
+    # and cutting it mid block leaves the last record incomplete
+    with open(path, 'rb') as f:
+        data = f.read()
+    copy = str(tmp_path / 'copy.log.gz')
+    with open(copy, 'wb') as f:
+        f.write(data[:len(data) - cut])
+    client.close()
+
+    stats = Replayer(copy).replay(endpoint, speed=None)
+    assert stats['requests'] == replayed and stats['errors'] == 0
+    assert len(received) == replayed
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / 'cut.log')
+    write_paced_log(path, [0.0, 0.1])
+    with open(path, 'a') as f:
+        f.write('{"t": 1, "m": "PO')
+    assert len(read_log(path)) == 2
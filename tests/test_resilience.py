@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from SignalPy import CircuitBreaker, CircuitOpenError, OneSignal, Response, Transport
+
+
+class ScriptedTransport(Transport):
+    """ answers with the next scripted outcome: a status code, an exception or a callable """
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers, body=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if callable(outcome) and not isinstance(outcome, type):
+            outcome = outcome()
+        if isinstance(outcome, BaseException) or isinstance(outcome, type):
+            raise outcome
+        return Response(outcome, b'{"id": "n"}', url)
+
+
+def test_breaker_opens_after_threshold_and_closes_after_probe():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=0.05)
+    assert breaker.state == 'closed'
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == 'half-open'
+    breaker.allow()
+    # only a single probe goes through while it is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+
+def test_client_opens_on_server_errors_but_not_on_client_errors():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_time=60)
+    client = OneSignal('app', 'key', breaker=breaker, transport=ScriptedTransport(400, 500, 503))
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            client.get('n')
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.get('n')
+
+
+@pytest.mark.parametrize('error', [RuntimeError('transport bug'), requests.ConnectionError()])
+def test_probe_raising_any_error_does_not_leave_the_circuit_stuck(error):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.05)
+    transport = ScriptedTransport(500, error, 200)
+    client = OneSignal('app', 'key', breaker=breaker, transport=transport)
+    with pytest.raises(requests.HTTPError):
+        client.get('n')
+
+    time.sleep(0.06)
+    with pytest.raises(type(error)):
+        client.get('n')
+    time.sleep(0.06)
+    assert client.get('n') == {'id': 'n'}
+    assert breaker.state == 'closed'
+
+
+def test_unserializable_payload_is_rejected_before_the_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_time=0.05)
+    transport = ScriptedTransport(500, 200)
+    client = OneSignal('app', 'key', breaker=breaker, transport=transport)
+    with pytest.raises(requests.HTTPError):
+        client.get('n')
+
+    time.sleep(0.06)
+    with pytest.raises(TypeError):
+        client._post(client._url, {}, {'include_player_ids': {'a'}})
+    assert transport.calls == 1
+    assert client.get('n') == {'id': 'n'}
+    assert breaker.state == 'closed'
+
+
+def test_slow_requests_are_hedged():
+    slow = threading.Event()
+
+    def stalled():
+        slow.wait(2)
+        return 200
+
+    transport = ScriptedTransport(*([200] * 20 + [stalled, 200]))
+    client = OneSignal('app', 'key', hedge=True, transport=transport)
+    for _ in range(20):
+        client.get('n')
+
+    start = time.monotonic()
+    assert client.get('n') == {'id': 'n'}
+    assert time.monotonic() - start < 1
+    assert transport.calls == 22
+    slow.set()
+    client.close()
+
+
+def test_fast_requests_are_not_hedged():
+    transport = ScriptedTransport(200)
+    client = OneSignal('app', 'key', hedge=True, transport=transport)
+    for _ in range(25):
+        client.get('n')
+    assert transport.calls == 25
+    client.close()
+
+
+def test_posts_do_not_feed_the_hedge_delay():
+    def slow_post():
+        time.sleep(0.05)
+        return 200
+
+    transport = ScriptedTransport(*([slow_post] * 20 + [200] * 20))
+    client = OneSignal('app', 'key', hedge=True, transport=transport)
+    for _ in range(20):
+        client._post(client._url, {}, {})
+    assert client._latency['GET'].percentile(0.95) is None
+    assert client._latency['DELETE'].percentile(0.95) is None
+
+    for _ in range(20):
+        client.get('n')
+    assert client._latency['GET'].percentile(0.95) < 0.05
+    assert client._latency['DELETE'].percentile(0.95) is None
+    client.close()
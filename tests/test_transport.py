@@ -0,0 +1,112 @@
+import socket
+
+import pytest
+import requests
+
+from SignalPy import (Http2Transport, LangCodes, Notification, OneSignal, RequestsTransport,
+                      Response)
+from benchmarks.standin import H2StandInServer, StandInServer
+
+
+def h2_transport():
+    pytest.importorskip('h2')
+    pytest.importorskip('httpx')
+    return Http2Transport(prior_knowledge=True)
+
+
+def http1(latency=0.0, **kwargs):
+    return StandInServer(latency, **kwargs).start(), RequestsTransport()
+
+
+def http2(latency=0.0):
+    transport = h2_transport()
+    return H2StandInServer(latency).start(), transport
+
+
+TRANSPORTS = [pytest.param(http1, id='http1'), pytest.param(http2, id='http2')]
+
+
+def notification(text: str, player_ids=None):
+    notification = Notification().add_content(LangCodes.English, text)
+    notification.data['include_player_ids'] = player_ids or ['a']
+    return notification
+
+
+def test_response_raise_for_status():
+    response = Response(200, b'{"id": "n"}', 'http://x')
+    response.raise_for_status()
+    assert response.json() == {'id': 'n'}
+
+    for status in (400, 429, 503):
+        with pytest.raises(requests.HTTPError) as raised:
+            Response(status, b'{}', 'http://x').raise_for_status()
+        assert raised.value.response.status_code == status
+
+
+@pytest.mark.parametrize('make', TRANSPORTS)
+def test_sync_calls(make):
+    server, transport = make()
+    client = OneSignal('app', 'key', transport=transport, url=server.url)
+    try:
+        sent = client.post(notification('hello', ['a', 'b', 'c']))
+        assert sent['recipients'] == 3
+        assert client.get(sent['id'])['id'] == sent['id']
+        assert client.cancel(sent['id']) == {'success': True}
+        assert server.stats.requests == 3
+    finally:
+        client.close()
+        server.stop()
+
+
+@pytest.mark.parametrize('make', TRANSPORTS)
+def test_post_many(make):
+    server, transport = make(latency=0.01)
+    client = OneSignal('app', 'key', transport=transport, url=server.url)
+    try:
+        results = list(client.post_many((notification(str(i)) for i in range(100)), workers=16))
+        assert sorted(index for index, _, _ in results) == list(range(100))
+        assert all(error is None and response['recipients'] == 1 for _, response, error in results)
+        assert server.stats.requests == 100
+    finally:
+        client.close()
+        server.stop()
+    if make is http2:
+        # every concurrent request was multiplexed over a single connection
+        assert server.stats.connections == 1
+
+
+@pytest.mark.parametrize('make', TRANSPORTS)
+def test_slow_responses_raise_requests_timeout(make):
+    server, transport = make(latency=1.0)
+    try:
+        with pytest.raises(requests.Timeout):
+            transport.request('GET', server.url + '/n', {}, None, (1, 0.1))
+    finally:
+        transport.close()
+        server.stop()
+
+
+@pytest.mark.parametrize('make', [pytest.param(RequestsTransport, id='http1'),
+                                  pytest.param(h2_transport, id='http2')])
+def test_refused_connections_raise_requests_connection_error(make):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    transport = make()
+    try:
+        with pytest.raises(requests.ConnectionError):
+            transport.request('GET', 'http://127.0.0.1:{}/n'.format(port), {}, None, (1, 1))
+    finally:
+        transport.close()
+
+
+def test_throttled_requests_surface_as_http_errors():
+    server, transport = http1(capacity=0)
+    client = OneSignal('app', 'key', transport=transport, url=server.url)
+    try:
+        with pytest.raises(requests.HTTPError) as raised:
+            client.post(notification('hello'))
+        assert raised.value.response.status_code == 429
+    finally:
+        client.close()
+        server.stop()
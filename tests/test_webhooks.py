@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from signalpy_webhooks import EventReceiver
+
+
+async def exchange(requests: list, receiver: EventReceiver):
+    reader, writer = await asyncio.open_connection('127.0.0.1', receiver.port)
+    statuses = []
+    for request in requests:
+        writer.write(request)
+        head = await reader.readuntil(b'\r\n\r\n')
+        statuses.append(int(head.split(b' ', 2)[1]))
+    writer.close()
+    return statuses
+
+
+def run(requests: list, tracked: dict = None):
+    events = []
+
+    async def main():
+        receiver = await EventReceiver(events.extend, host='127.0.0.1', port=0).start()
+        for notification_id, context in (tracked or {}).items():
+            receiver.track({'id': notification_id, 'recipients': 1}, **context)
+        statuses = await exchange(requests, receiver)
+        metrics = receiver.metrics()
+        await receiver.stop()
+        return statuses, metrics
+
+    statuses, metrics = asyncio.run(main())
+    return statuses, events, metrics
+
+
+def post(body: bytes, path: bytes = b'/hook'):
+    return (b'POST ' + path + b' HTTP/1.1\r\nHost: localhost\r\nContent-Length: ' +
+            str(len(body)).encode() + b'\r\n\r\n' + body)
+
+
+def test_nested_keys_do_not_override_top_level_fields():
+    body = json.dumps({'event': 'notification.clicked', 'id': 'n1',
+                       'additionalData': {'event': 'purchase', 'userId': 'other', 'id': 'x',
+                                          'items': [{'id': 'y'}]},
+                       'userId': 'u1'}).encode()
+    statuses, events, _ = run([post(body)])
+    assert statuses == [200]
+    assert [event[1:4] for event in events] == [('notification.clicked', 'n1', 'u1')]
+
+
+def test_flat_bodies_and_escaped_values():
+    body = b'{"event": "notification.displayed", "id": "n\\"1", "userId": "u1"}'
+    _, events, _ = run([post(body)])
+    assert events[0][1:4] == ('notification.displayed', 'n"1', 'u1')
+
+
+def test_chunked_bodies_are_reassembled():
+    body = json.dumps({'event': 'notification.dismissed', 'id': 'n2',
+                       'userId': 'u2'}).encode()
+    chunked = (b'POST /hook HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n' +
+               b'%x\r\n' % 10 + body[:10] + b'\r\n' +
+               b'%x;ext=1\r\n' % (len(body) - 10) + body[10:] + b'\r\n0\r\n\r\n')
+    statuses, events, _ = run([chunked, post(body)])
+    assert statuses == [200, 200]
+    assert [event[1:4] for event in events] == [('notification.dismissed', 'n2', 'u2')] * 2
+    assert events[0][5] == body
+
+
+def test_malformed_chunk_size_is_rejected_without_ingesting():
+    request = (b'POST /hook HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n'
+               b'zz\r\n{}\r\n0\r\n\r\n')
+    statuses, events, _ = run([request])
+    assert statuses == [400]
+    assert events == []
+
+
+def test_events_are_correlated_with_tracked_notifications():
+    callbacks = [json.dumps({'event': 'notification.clicked', 'id': 'n1', 'userId': 'u1',
+                             'heading': 'Title', 'content': 'Body', 'url': 'https://example.com'}).encode(),
+                 json.dumps({'event': 'notification.displayed', 'notificationId': 'n1',
+                             'userId': 'u2'}).encode(),
+                 json.dumps({'event': 'notification.dismissed', 'id': 'other', 'userId': 'u3'}).encode()]
+    _, events, metrics = run([post(body) for body in callbacks], tracked={'n1': {'campaign': 'spring'}})
+
+    assert [(event[2], event[4]) for event in events] == [
+        ('n1', '{"campaign": "spring"}'), ('n1', '{"campaign": "spring"}'), ('other', None)]
+    assert metrics['unmatched'] == 1